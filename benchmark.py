@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+'''
+This module provides functions for timing and memory-profiling each
+stage of the analyses (loading, shuffling, counting and simulating)
+on synthetic datasets generated with data_generator.
+
+Results are written to a JSON file, so that runs can be compared over
+time to spot performance regressions.
+'''
+
+import argparse
+import json
+import os
+import platform
+import time
+import tracemalloc
+from datetime import datetime
+
+from data_generator import generate_dataset
+from reading_files import get_cheaters, get_teams, get_kills
+from cheaters_teaming_up import get_cheater_counters
+from cheaters_interactions import match_starting_time, counter_victim_cheaters, get_observer_cheaters
+from team_randomization import get_shuffled_teams
+from kills_randomization import get_shuffled_kills
+from simulations_cheating import cheaters_teaming_up_simulation, victim_cheaters_simulation, \
+    observer_cheaters_simulation
+
+
+def time_stage(name, function, *args, memory=True):
+    '''Runs a function once, measuring its wall time, CPU time and (if
+    memory is True) the peak memory allocated while it runs.
+
+    Takes as argument the name of the stage, the function and its
+    arguments. Returns a tuple with the output of the function and a
+    dictionary with the measurements.
+    '''
+
+    # tracemalloc slows down the code it measures, so it can be turned
+    # off when only times are of interest.
+    if memory:
+        tracemalloc.start()
+
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    output = function(*args)
+    cpu_time = time.process_time() - cpu_start
+    wall_time = time.perf_counter() - wall_start
+
+    result = {'stage': name, 'wall_time': wall_time, 'cpu_time': cpu_time}
+
+    if memory:
+        result['peak_memory'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return output, result
+
+
+def victim_counting(kills, cheaters):
+    '''Counts the 'victim cheaters', including the computation of the
+    starting time of each match.
+    '''
+
+    matches_start = match_starting_time(kills)
+    return counter_victim_cheaters(kills, matches_start, cheaters)
+
+
+def benchmark_dataset(data_dir, replicates=2, memory=True):
+    '''Times every stage of the analyses on the data files in a folder.
+
+    Takes as argument the folder with the data files, the number of
+    replicates for the full simulations, and whether to measure memory.
+
+    Returns a list of dictionaries, one for each stage.
+    '''
+
+    results = []
+
+    cheaters, result = time_stage('get_cheaters', get_cheaters, os.path.join(data_dir, 'cheaters.txt'),
+                                  memory=memory)
+    results.append(result)
+    teams, result = time_stage('get_teams', get_teams, os.path.join(data_dir, 'team_ids.txt'), memory=memory)
+    results.append(result)
+    kills, result = time_stage('get_kills', get_kills, os.path.join(data_dir, 'kills.txt'), memory=memory)
+    results.append(result)
+
+    # The shuffling of kills updates the list in place, so I shuffle a copy
+    # (made outside the measured stage) to keep the original data intact.
+    kills_copy = [kill[:] for kill in kills]
+    results.append(time_stage('get_shuffled_teams', get_shuffled_teams, teams, memory=memory)[1])
+    results.append(time_stage('get_shuffled_kills', get_shuffled_kills, kills_copy, memory=memory)[1])
+    del kills_copy
+
+    results.append(time_stage('get_cheater_counters', get_cheater_counters, cheaters, teams, memory=memory)[1])
+    results.append(time_stage('victim_counting', victim_counting, kills, cheaters, memory=memory)[1])
+    results.append(time_stage('get_observer_cheaters', get_observer_cheaters, cheaters, kills, memory=memory)[1])
+
+    for simulation in [cheaters_teaming_up_simulation, victim_cheaters_simulation, observer_cheaters_simulation]:
+        results.append(time_stage(simulation.__name__, simulation, replicates, data_dir, memory=memory)[1])
+
+    for result in results:
+        result['rows'] = {'cheaters': len(cheaters), 'teams': len(teams), 'kills': len(kills)}
+
+    return results
+
+
+def run_benchmarks(output_path, scales, modes, cheater_rate=0.01, replicates=2, seed=0,
+                   work_dir='benchmark-data', memory=True):
+    '''Generates a dataset for every combination of scale and game mode,
+    benchmarks each of them, and writes all the results to a JSON file.
+
+    Takes as argument the path of the output file, a list of numbers of
+    kills, a list of game modes, the fraction of cheaters, the number of
+    replicates for the full simulations, a seed, the folder where the
+    datasets are generated, and whether to measure memory.
+
+    Returns the dictionary written to the output file.
+    '''
+
+    report = {
+        'created': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'seed': seed,
+        'replicates': replicates,
+        'runs': [],
+    }
+
+    for mode in modes:
+        for nr_kills in scales:
+
+            data_dir = os.path.join(work_dir, mode + '-' + str(nr_kills) + '-' + str(seed))
+
+            # Generating large datasets takes a while, so existing ones
+            # (with the same arguments) are reused.
+            if not os.path.exists(os.path.join(data_dir, 'kills.txt')):
+                generate_dataset(data_dir, nr_kills, mode, cheater_rate, seed=seed)
+
+            report['runs'].append({
+                'mode': mode,
+                'kills': nr_kills,
+                'cheater_rate': cheater_rate,
+                'stages': benchmark_dataset(data_dir, replicates, memory),
+            })
+
+    with open(output_path, 'w') as file:
+        json.dump(report, file, indent=2)
+
+    return report
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Benchmark every stage of the analyses on synthetic data.')
+    parser.add_argument('--output', default='benchmark.json', help='JSON file where results are written')
+    parser.add_argument('--scales', type=int, nargs='+', default=[10 ** 4, 10 ** 5], help='numbers of kills')
+    parser.add_argument('--modes', nargs='+', default=['squad'], choices=['solo', 'duo', 'squad'],
+                        help='game modes')
+    parser.add_argument('--cheater-rate', type=float, default=0.01, help='fraction of players which cheat')
+    parser.add_argument('--replicates', type=int, default=2, help='replicates of each full simulation')
+    parser.add_argument('--seed', type=int, default=0, help='random seed for the datasets')
+    parser.add_argument('--work-dir', default='benchmark-data', help='folder for the generated datasets')
+    parser.add_argument('--no-memory', action='store_true', help='skip memory profiling (faster)')
+    args = parser.parse_args()
+
+    run_benchmarks(args.output, args.scales, args.modes, args.cheater_rate, args.replicates, args.seed,
+                   args.work_dir, not args.no_memory)
@@ -17,7 +17,10 @@ kill 3 players.
 from datetime import datetime
 from collections import defaultdict
 
+from instrumentation import instrumented
 
+
+@instrumented('match_starting_time')
 def match_starting_time(kills):
     '''Stores the starting time of a given match in a dictionary.
     
@@ -43,6 +46,7 @@ def match_starting_time(kills):
     return matches_start
 
 
+@instrumented('counter_victim_cheaters')
 def counter_victim_cheaters(kills, matches_start, cheaters):
     '''Computes the number of players which started cheating after being
     killed by an actively cheating player.
@@ -77,6 +81,7 @@ def counter_victim_cheaters(kills, matches_start, cheaters):
     return len(victim_cheaters)
 
 
+@instrumented('pre_cheating_matches')
 def pre_cheating_matches(kills, cheaters, matches_start):
     '''Stores the matches played by cheating players before they started
     cheating, and their time of death in each of these matches.
@@ -120,6 +125,7 @@ def pre_cheating_matches(kills, cheaters, matches_start):
 # iterating only once through 'kills' but I decided to separate them
 # for modularity.
 
+@instrumented('match_kills_per_cheater')
 def match_kills_per_cheater(kills, cheaters, matches_start):
     '''Stores the matches played by cheating players after they started
     cheating, and the timestamps of all the kills they got in each match.
@@ -150,6 +156,7 @@ def match_kills_per_cheater(kills, cheaters, matches_start):
     return match_kills_per_cheater
 
 
+@instrumented('match_earliest_3rd_kill')
 def match_earliest_3rd_kill(match_kills_per_cheater):
     '''Stores the time at which an actively cheating player first got
     3 kills for each match.
@@ -187,6 +194,7 @@ def match_earliest_3rd_kill(match_kills_per_cheater):
     return match_earliest_3rd_kill
 
 
+@instrumented('counter_observer_cheaters')
 def counter_observer_cheaters(pre_cheating_matches, match_earliest_3rd_kill):
     '''Computes the number of players which started cheating after playing a
     match in which an actively cheating player had at least 3 kills.
@@ -218,6 +226,7 @@ def counter_observer_cheaters(pre_cheating_matches, match_earliest_3rd_kill):
     return len(observer_cheaters)
 
 
+@instrumented('get_observer_cheaters', rows=1)
 def get_observer_cheaters(cheaters, kills):
     ''' Executes the defined functions necessary to obtain the number of cheaters
     which started cheating after playing a match where an actively cheating player
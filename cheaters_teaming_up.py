@@ -13,6 +13,8 @@ team, the total amount of teams, and number of teams with 0, 1, 2,
 
 from collections import defaultdict
 
+from instrumentation import instrumented
+
 
 def set_from_dict(dictionary):
     '''Takes a dictionary as an argument and returns a set, where the
@@ -23,6 +25,7 @@ def set_from_dict(dictionary):
     return final_set
 
 
+@instrumented('cheaters_per_team')
 def cheaters_per_team(teams, cheaters_set):
     '''Counts the amount of cheaters per team.
     
@@ -63,6 +66,15 @@ def cheaters_per_team(teams, cheaters_set):
     return teams_cheaters_dict, total_nr_teams
 
 
+def count_teams(teams):
+    ''' Counts the unique teams (match - team combinations) of a list with
+    details of team membership for each player, as cheaters_per_team does.
+    '''
+    
+    return len({match_id + ' - ' + team_number for [match_id, player_id, team_number] in teams})
+
+
+@instrumented('counters_team_with_cheaters')
 def counters_team_with_cheaters(teams_cheaters_dict, total_nr_teams):
     ''' Computes the amount of teams which have 0, 1, 2, 3, or 4 cheaters.
     
@@ -95,6 +107,7 @@ def counters_team_with_cheaters(teams_cheaters_dict, total_nr_teams):
     return zero_cheaters, one_cheater, two_cheaters, three_cheaters, four_cheaters
 
 
+@instrumented('get_cheater_counters', rows=1)
 def get_cheater_counters(cheaters, teams):
     ''' Executes the defined functions necessary to obtain the number of teams
     with 0, 1, 2, 3, or 4 cheaters.
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+'''
+This module provides functions for generating synthetic data files
+(kills.txt, team_ids.txt and cheaters.txt) with the same format as the
+original PUBG data, at any scale. This allows us to measure how the
+analyses perform on datasets much larger than the original one.
+
+The data is generated from a seed, so the same arguments always produce
+the same files.
+'''
+
+import argparse
+import math
+import os
+import random
+from datetime import datetime, timedelta
+
+
+# Number of players on each team, for every game mode. Solo matches do not
+# appear in team_ids.txt, as in the original data.
+TEAM_SIZES = {'solo': 1, 'duo': 2, 'squad': 4}
+
+PLAYERS_PER_MATCH = 100
+MATCHES_PER_PLAYER = 20
+FIRST_DAY = datetime(2019, 3, 1)
+NR_DAYS = 10
+
+
+def account_id(player):
+    '''Returns the account id of the player with a given index, in the
+    same format as the original data ('account.' and 32 hex digits).
+    '''
+
+    # Multiplying by an odd constant modulo 2 ** 128 is a bijection, so
+    # every index gets a different (but scrambled looking) account id.
+    return 'account.{:032x}'.format(((player + 1) * 0x9E3779B97F4A7C15F39CC0605CEDC835) % 2 ** 128)
+
+
+def match_id(match):
+    '''Returns the match id of the match with a given index.'''
+
+    return 'match.{:032x}'.format(((match + 1) * 0xC2B2AE3D27D4EB4F165667B19E3779F9) % 2 ** 128)
+
+
+def generate_cheaters(path, nr_players, cheater_rate, rng):
+    '''Writes a cheaters.txt file, choosing a fraction (cheater_rate) of
+    the players as cheaters.
+
+    Takes as argument the path of the file, the number of players, the
+    fraction of cheaters, and a random.Random instance.
+
+    Returns the number of cheaters written.
+    '''
+
+    nr_cheaters = int(nr_players * cheater_rate)
+
+    with open(path, 'w') as file:
+        for player in rng.sample(range(nr_players), nr_cheaters):
+
+            # As in the original data, players start cheating within the
+            # period of the matches, and are banned some days later.
+            start_day = rng.randrange(NR_DAYS)
+            ban_day = start_day + 1 + int(rng.expovariate(1 / 7))
+            start_date = FIRST_DAY + timedelta(days=start_day)
+            ban_date = FIRST_DAY + timedelta(days=ban_day)
+
+            file.write(account_id(player) + '\t' + start_date.strftime('%Y-%m-%d') + '\t'
+                       + ban_date.strftime('%Y-%m-%d') + '\n')
+
+    return nr_cheaters
+
+
+def generate_matches(kills_path, teams_path, nr_kills, nr_players, mode, rng):
+    '''Writes the kills.txt and team_ids.txt files.
+
+    Each match has PLAYERS_PER_MATCH players drawn from the pool of
+    players. Players are killed one at a time by a player still alive,
+    until only one remains, so each match has PLAYERS_PER_MATCH - 1 kills
+    (the last match is cut short so that the total is exactly nr_kills).
+
+    Takes as argument the paths of both files, the total number of kills,
+    the number of players, the game mode ('solo', 'duo' or 'squad'), and
+    a random.Random instance.
+
+    Returns the number of matches written.
+    '''
+
+    team_size = TEAM_SIZES[mode]
+    kills_per_match = PLAYERS_PER_MATCH - 1
+    nr_matches = math.ceil(nr_kills / kills_per_match)
+    kills_left = nr_kills
+
+    # I write the files line by line, so that memory use does not grow
+    # with the number of kills.
+    with open(kills_path, 'w') as kills_file, open(teams_path, 'w') as teams_file:
+        for match in range(nr_matches):
+
+            current_match_id = match_id(match)
+            players = [account_id(player) for player in rng.sample(range(nr_players), PLAYERS_PER_MATCH)]
+
+            if team_size > 1:
+                team_numbers = [str(index // team_size + 1) for index in range(PLAYERS_PER_MATCH)]
+                rng.shuffle(team_numbers)
+                teams_file.writelines(current_match_id + '\t' + player + '\t' + team_number + '\n'
+                                      for player, team_number in zip(players, team_numbers))
+
+            # Matches take place at any time within the period, and kills
+            # are spread over roughly half an hour.
+            death_time = FIRST_DAY + timedelta(seconds=rng.uniform(0, NR_DAYS * 86400 - 3600))
+            alive = players[:]
+            lines = []
+
+            for kill in range(min(kills_per_match, kills_left)):
+
+                death_time += timedelta(seconds=rng.expovariate(kills_per_match / 1800))
+                killer = rng.choice(alive)
+                killed = rng.choice(alive)
+                while killed == killer:
+                    killed = rng.choice(alive)
+                alive.remove(killed)
+
+                lines.append(current_match_id + '\t' + killer + '\t' + killed + '\t'
+                             + death_time.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3] + '\n')
+
+            kills_file.writelines(lines)
+            kills_left -= len(lines)
+
+    return nr_matches
+
+
+def generate_dataset(data_dir, nr_kills, mode='squad', cheater_rate=0.01, nr_players=None, seed=0):
+    '''Generates a full synthetic dataset (cheaters.txt, team_ids.txt and
+    kills.txt) in a folder.
+
+    Takes as argument the folder where the files are written, the number
+    of kills, the game mode ('solo', 'duo' or 'squad'), the fraction of
+    players which are cheaters, the number of players (by default, enough
+    for each player to play about MATCHES_PER_PLAYER matches) and a seed.
+
+    Returns a dictionary with the number of kills, matches, players and
+    cheaters in the dataset.
+    '''
+
+    if mode not in TEAM_SIZES:
+        raise ValueError('mode must be one of ' + ', '.join(TEAM_SIZES))
+
+    nr_matches = math.ceil(nr_kills / (PLAYERS_PER_MATCH - 1))
+    if nr_players is None:
+        nr_players = max(PLAYERS_PER_MATCH, nr_matches * PLAYERS_PER_MATCH // MATCHES_PER_PLAYER)
+
+    os.makedirs(data_dir, exist_ok=True)
+    rng = random.Random(seed)
+
+    nr_cheaters = generate_cheaters(os.path.join(data_dir, 'cheaters.txt'), nr_players, cheater_rate, rng)
+    nr_matches = generate_matches(os.path.join(data_dir, 'kills.txt'), os.path.join(data_dir, 'team_ids.txt'),
+                                  nr_kills, nr_players, mode, rng)
+
+    return {'kills': nr_kills, 'matches': nr_matches, 'players': nr_players, 'cheaters': nr_cheaters}
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Generate synthetic PUBG-like data files.')
+    parser.add_argument('data_dir', help='folder where the data files are written')
+    parser.add_argument('--kills', type=int, default=10 ** 5, help='number of kills')
+    parser.add_argument('--mode', choices=sorted(TEAM_SIZES), default='squad', help='game mode')
+    parser.add_argument('--cheater-rate', type=float, default=0.01, help='fraction of players which cheat')
+    parser.add_argument('--players', type=int, default=None, help='number of players')
+    parser.add_argument('--seed', type=int, default=0, help='random seed')
+    args = parser.parse_args()
+
+    print(generate_dataset(args.data_dir, args.kills, args.mode, args.cheater_rate, args.players, args.seed))
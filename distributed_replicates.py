@@ -0,0 +1,438 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+'''
+This module provides functions for distributing the randomized
+replicates of the analyses among worker processes, on this or other
+machines, over TCP.
+
+Each worker loads the data once and waits for tasks. A task carries the
+fingerprint of the dataset (so that workers with different data refuse
+it), the engine, the seed, a range of replicate indexes and the list of
+statistics, and the worker answers with the values of those replicates,
+which are written into their own slice of the arrays whatever the order
+in which tasks finish. Since each replicate has its own seed, the merged
+output is the same as a local run, whatever the number of workers.
+
+Messages are JSON objects preceded by their length (4 bytes), so that
+no code is ever unpickled from the network. While a task runs, which can
+take a long time on the full data, the worker sends heartbeats every few
+seconds, so that the client can tell a slow task from a lost worker.
+
+To start a worker:
+
+    python distributed_replicates.py --port 5001 --workers 8 --cheaters ... --teams ... --kills ...
+
+To check, without any outside service, that several workers on
+localhost give the same values as a local run:
+
+    python distributed_replicates.py --check --cheaters ... --teams ... --kills ...
+'''
+
+import argparse
+import json
+import socket
+import socketserver
+import struct
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from reading_files import CHEATERS_PATH, TEAMS_PATH, KILLS_PATH
+from simulations_cheating import ENGINES, STATISTICS, TIMES, load_data, data_fingerprint, run_replicates, \
+    allocate_times
+from replicate_storage import allocate_replicates, flush_replicates
+from exposure_index import exposure_dtypes
+
+
+# Seconds a client waits for a connection or for any message from a
+# worker. Workers running a task send heartbeats four times as often.
+TIMEOUT = 60
+
+# Largest number of replicates sent in a single task, so that work is
+# balanced among workers and a lost task is cheap to run again.
+MAX_CHUNK_SIZE = 100
+
+
+def send_message(connection, message):
+    '''Sends a dictionary as a JSON message through a socket.'''
+
+    data = json.dumps(message).encode('utf-8')
+    connection.sendall(struct.pack('>I', len(data)) + data)
+
+
+def _receive_exactly(connection, size):
+    '''Receives exactly size bytes from a socket, or raises
+    ConnectionError if the other side closes it before.
+    '''
+
+    data = bytearray()
+    while len(data) < size:
+        block = connection.recv(size - len(data))
+        if not block:
+            raise ConnectionError('connection closed')
+        data.extend(block)
+    return bytes(data)
+
+
+def receive_message(connection):
+    '''Receives a JSON message from a socket, and returns it as a
+    dictionary.
+    '''
+
+    size = struct.unpack('>I', _receive_exactly(connection, 4))[0]
+    return json.loads(_receive_exactly(connection, size).decode('utf-8'))
+
+
+def partial_statistics(values, first, times=None):
+    '''Builds the partial results of a range of replicates.
+
+    Takes as argument a dictionary pairing statistic names with the list
+    (or array) of their values, the index of the first replicate in the
+    range, and optionally the arrays with the times of each replicate (as
+    returned by allocate_times).
+
+    Returns a dictionary with the first index, the number of replicates,
+    the values and the times, which the client writes into its own slice
+    of the arrays.
+    '''
+
+    # Plain lists of Python numbers, so that they can be sent as JSON.
+    values = {name: np.asarray(lst).tolist() for name, lst in values.items()}
+
+    return {
+        'first': first,
+        'count': len(next(iter(values.values()), [])),
+        'values': values,
+        'times': {name: np.asarray(lst).tolist() for name, lst in (times or {}).items()},
+    }
+
+
+def handle_task(data, task, workers=1):
+    '''Runs a task received by a worker.
+
+    Takes as argument the dictionary returned by load_data, the task, and
+    the number of processes of the worker running its replicates. Returns the partial results of the task, or a dictionary with an
+    'error' message if the task does not match the data of the worker.
+    '''
+
+    if task['fingerprint'] != data_fingerprint(data):
+        return {'error': 'dataset fingerprint does not match the data of this worker'}
+    if task['engine'] != data['engine']:
+        return {'error': 'this worker runs the ' + data['engine'] + ' engine'}
+
+    times = allocate_times(task['count'])
+    values = run_replicates(data, task['count'], task['seed'], task['statistics'], workers, task['first'],
+                            times=times)
+    return partial_statistics(values, task['first'], times)
+
+
+class _WorkerServer(socketserver.ThreadingTCPServer):
+    '''TCP server of a worker, which can be restarted on the same port
+    straight away.
+
+    Connections are answered in their own threads, and each replicate has
+    its own random generator, so tasks sent through several connections
+    can run at the same time.
+    '''
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class _TaskHandler(socketserver.BaseRequestHandler):
+    '''Answers the tasks sent through one connection, until it is closed.'''
+
+    def handle(self):
+        while True:
+            try:
+                task = receive_message(self.request)
+            except ConnectionError:
+                return
+
+            # The task runs in its own thread, so that heartbeats can be
+            # sent while it runs.
+            partial = []
+            runner = threading.Thread(target=self._run_task, args=(task, partial), daemon=True)
+            runner.start()
+            runner.join(task['heartbeat_interval'])
+            while runner.is_alive():
+                send_message(self.request, {'heartbeat': True})
+                runner.join(task['heartbeat_interval'])
+
+            # If the task raised an error, I close the connection, so that
+            # the client sends it to another worker.
+            if not partial:
+                return
+            send_message(self.request, partial[0])
+
+    def _run_task(self, task, partial):
+        partial.append(handle_task(self.server.data, task, self.server.workers))
+
+
+def start_worker(host, port, data, workers=1):
+    '''Starts a worker in a background thread of this process.
+
+    Takes as argument the host and port to listen on (port 0 for any free
+    port), the dictionary returned by load_data, and the number of
+    processes running the replicates of each task.
+
+    Returns the server, whose server_address is the (host, port) it
+    listens on, and which is stopped with its shutdown method.
+    '''
+
+    # The fingerprint is computed before any task arrives.
+    data_fingerprint(data)
+
+    server = _WorkerServer((host, port), _TaskHandler)
+    server.data = data
+    server.workers = workers
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def serve_worker(host, port, data, workers=1):
+    '''Starts a worker, answering tasks on the given address until it is
+    interrupted.
+
+    Takes as argument the host and port to listen on, the dictionary
+    returned by load_data, and the number of processes running the
+    replicates of each task (e.g. the number of cores of the machine).
+    '''
+
+    data_fingerprint(data)
+
+    with _WorkerServer((host, port), _TaskHandler) as server:
+        server.data = data
+        server.workers = workers
+        server.serve_forever()
+
+
+def _run_tasks(address, tasks, results, replicates, times, state, timeout, retries):
+    '''Sends tasks to one worker until all of them are done. Runs in one
+    thread per worker.
+
+    Takes as argument the (host, port) of the worker, the list of tasks
+    still to run, the set of the first replicate of finished tasks, the
+    arrays where the values and (if not None) the times of the replicates
+    are stored (with the first replicate of the run as index 0), a
+    dictionary with the shared lock, number of tasks,
+    failure counts and error, the seconds to wait for the connection or
+    for any message of the worker, and the number of times a task or the
+    worker (in a row) may fail.
+    '''
+
+    connection = None
+    worker_failures = 0
+
+    while True:
+
+        with state['lock']:
+            if state['error'] is not None or len(results) == state['nr_tasks']:
+                break
+            task = tasks.pop() if tasks else None
+
+        # When no task is left, but others are still running, I wait in
+        # case their worker is lost and they come back to the list.
+        if task is None:
+            time.sleep(0.05)
+            continue
+
+        sent = False
+        try:
+            if connection is None:
+                connection = socket.create_connection(address, timeout=timeout)
+            sent = True
+            send_message(connection, task)
+            # The timeout applies to each message, and the worker sends
+            # heartbeats while the task runs, however long it takes.
+            partial = receive_message(connection)
+            while partial.get('heartbeat'):
+                partial = receive_message(connection)
+
+        except (OSError, ValueError) as error:
+            # The worker was lost (or answered garbage), so the task goes
+            # back to the list for another worker, and I drop the
+            # connection to try again a bit later.
+            if connection is not None:
+                connection.close()
+                connection = None
+            worker_failures += 1
+
+            with state['lock']:
+                # A task only counts as failed if it reached the worker, so
+                # that unreachable workers do not use up its retries.
+                if sent:
+                    state['task_failures'][task['first']] += 1
+                    if state['task_failures'][task['first']] > retries:
+                        state['error'] = 'replicates from ' + str(task['first']) + ' failed: ' + str(error)
+                tasks.append(task)
+
+            if worker_failures > retries:
+                break
+            time.sleep(0.1 * worker_failures)
+            continue
+
+        # Only consecutive failures give up on the worker.
+        worker_failures = 0
+
+        with state['lock']:
+            if 'error' in partial:
+                state['error'] = str(address) + ': ' + partial['error']
+            else:
+                # Each task fills its own slice of the arrays, so that the
+                # partial results do not need to be kept.
+                offset = partial['first'] - state['first']
+                for name, lst in partial['values'].items():
+                    replicates[name][offset:offset + len(lst)] = lst
+                if times is not None:
+                    for name in TIMES:
+                        times[name][offset:offset + partial['count']] = partial['times'][name]
+                results.add(partial['first'])
+
+    if connection is not None:
+        connection.close()
+
+
+def run_distributed(hosts, fingerprint, engine, n, seed=0, statistics=None, first=0, chunk_size=None,
+                    timeout=None, retries=2, replicates=None, times=None):
+    '''Runs n replicates on remote workers, and merges their results.
+
+    Takes as argument a list of (host, port) addresses of workers, the
+    fingerprint of the dataset and the engine (which the workers check
+    against their own), the number of replicates, a seed, a list of
+    statistic names (by default, all of them), the index of the first
+    replicate, the number of replicates per task (by default, enough for
+    four tasks per worker, up to MAX_CHUNK_SIZE), the seconds to wait for
+    a connection or for any message (result or heartbeat) of a worker (by
+    default, TIMEOUT), the number of times a task or a worker (in a row)
+    may fail before giving up, optionally the arrays where the values are
+    stored (as returned by allocate_replicates; by default, the counts are
+    stored as DEFAULT_DTYPE, since the bounds of replicate_dtypes depend on
+    data which is only on the workers), and optionally the arrays
+    where the times of each replicate, measured by the workers, are stored
+    (as returned by allocate_times).
+
+    Returns a dictionary pairing each statistic name with the array of its
+    values, in the order of the replicates, as run_replicates does.
+    '''
+
+    if statistics is None:
+        statistics = STATISTICS
+    if chunk_size is None:
+        chunk_size = max(1, min(MAX_CHUNK_SIZE, -(-n // (4 * len(hosts)))))
+    if timeout is None:
+        timeout = TIMEOUT
+
+    # Tasks are popped from the end of the list, so I build it backwards
+    # to send the first replicates first.
+    tasks = []
+    for start in range(first, first + n, chunk_size):
+        tasks.append({
+            'fingerprint': fingerprint,
+            'engine': engine,
+            'seed': seed,
+            'first': start,
+            'count': min(chunk_size, first + n - start),
+            'statistics': list(statistics),
+            'heartbeat_interval': timeout / 4,
+        })
+    tasks.reverse()
+
+    if replicates is None:
+        replicates = allocate_replicates(statistics, n, dtypes=exposure_dtypes(statistics))
+
+    results = set()
+    state = {
+        'first': first,
+        'lock': threading.Lock(),
+        'nr_tasks': len(tasks),
+        'task_failures': defaultdict(int),
+        'error': None,
+    }
+
+    threads = [threading.Thread(target=_run_tasks,
+                                args=(tuple(address), tasks, results, replicates, times, state, timeout,
+                                      retries))
+               for address in hosts]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if state['error'] is not None:
+        raise RuntimeError(state['error'])
+    if len(results) < state['nr_tasks']:
+        raise RuntimeError('all workers were lost before the replicates were finished')
+
+    flush_replicates(replicates)
+    return replicates
+
+
+def check_localhost(data, n=16, seed=7, nr_workers=3, connections=2, workers=2):
+    '''Checks that replicates run on several workers on localhost give
+    the same values as a local run.
+
+    Takes as argument the dictionary returned by load_data, the number of
+    replicates, a seed, the number of workers, and the number of
+    connections opened to each worker (several connections to the same
+    worker run their tasks concurrently), and the number of processes of
+    each worker.
+
+    Returns the list of statistic names whose values differ (empty if the
+    check passes).
+    '''
+
+    expected = run_replicates(data, n, seed)
+
+    servers = [start_worker('127.0.0.1', 0, data, workers) for worker in range(nr_workers)]
+    try:
+        hosts = [server.server_address for server in servers] * connections
+        replicates = run_distributed(hosts, data_fingerprint(data), data['engine'], n, seed, chunk_size=1)
+    finally:
+        for server in servers:
+            server.shutdown()
+            server.server_close()
+
+    return [name for name in expected if not np.array_equal(expected[name], replicates[name])]
+
+
+def parse_address(address):
+    '''Translates a 'host:port' string into a (host, port) tuple.'''
+
+    host, port = address.rsplit(':', 1)
+    return host, int(port)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Start a worker answering replicate tasks over TCP.')
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on')
+    parser.add_argument('--port', type=int, default=None, help='port to listen on')
+    parser.add_argument('--cheaters', default=CHEATERS_PATH, help='path of cheaters.txt')
+    parser.add_argument('--teams', default=TEAMS_PATH, help='path of team_ids.txt')
+    parser.add_argument('--kills', default=KILLS_PATH, help='path of kills.txt')
+    parser.add_argument('--engine', choices=ENGINES, default='python', help='implementation of the analyses')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of processes running the replicates of each task (e.g. one per core)')
+    parser.add_argument('--check', action='store_true',
+                        help='instead of serving, check that several workers on localhost match a local run')
+    args = parser.parse_args()
+
+    if not args.check and args.port is None:
+        parser.error('--port is required unless --check is given')
+
+    data = load_data(args.cheaters, args.teams, args.kills, args.engine)
+
+    if args.check:
+        mismatches = check_localhost(data, workers=max(2, args.workers))
+        if mismatches:
+            raise SystemExit('distributed replicates differ from the local run: ' + ', '.join(mismatches))
+        print('distributed replicates match the local run')
+    else:
+        serve_worker(args.host, args.port, data, args.workers)
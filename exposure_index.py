@@ -0,0 +1,255 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+'''
+This module provides functions for analysing how long after being
+exposed to cheating players started cheating themselves.
+
+A single pass over the kills builds, for every cheating player, sorted
+lists of the times at which they were exposed to cheating: killed by an
+actively cheating player, or observing a cheating player get at least 3
+kills (with the same conditions as counter_victim_cheaters and
+get_observer_cheaters). Latencies between exposure and adoption, and the
+number of players who started cheating within a given number of days
+after an exposure, are then answered by binary search in those lists.
+
+The results are flattened into statistics with self-describing names
+(see exposure_statistic_names), so that simulations_cheating computes
+them on the same randomized kills as the other statistics, with any
+engine, worker processes or remote workers. The vectorized engine finds
+the same latencies with array operations (see exposure_latencies in
+vectorized_engine).
+'''
+
+import re
+from bisect import bisect_left
+from datetime import timedelta
+
+import numpy as np
+
+from cheaters_interactions import match_starting_time, match_kills_per_cheater, match_earliest_3rd_kill
+from instrumentation import instrumented
+
+
+EXPOSURES = ['killed_by_cheater', 'observed_cheater']
+WINDOWS = [1, 3, 7]
+ONE_DAY = timedelta(days=1)
+
+# Names of the windowed counts, e.g. 'observed_cheater_within_3d' or
+# 'killed_by_cheater_ever', from which the windows are read back.
+_WINDOWED_NAME = re.compile('(' + '|'.join(EXPOSURES) + r')_(?:ever|within_(\d+)d)')
+
+
+def intern_cheaters(cheaters):
+    '''Creates a dictionary pairing every cheating player account id with
+    an integer code, in the order of the cheaters dictionary.
+    '''
+
+    return {player_id: code for code, player_id in enumerate(cheaters)}
+
+
+@instrumented('build_exposure_index')
+def build_exposure_index(kills, cheaters):
+    '''Builds the index of exposures to cheating of every cheating player.
+
+    Only cheaters are ever asked about, so the kills of other players are
+    skipped with a single lookup, and the index only grows with the number
+    of cheaters.
+
+    Takes as argument a list of kills and the cheaters dictionary.
+
+    Returns a dictionary with the cheater codes (see intern_cheaters) and,
+    for each kind of exposure, a list (indexed by cheater code) of sorted
+    lists of the starting times of the matches where the cheater was
+    exposed.
+    '''
+
+    cheater_codes = intern_cheaters(cheaters)
+
+    matches_start = match_starting_time(kills)
+    earliest_3rd_kills = match_earliest_3rd_kill(match_kills_per_cheater(kills, cheaters, matches_start))
+
+    killed_by_cheater = [[] for code in range(len(cheater_codes))]
+    observed_cheater = [[] for code in range(len(cheater_codes))]
+
+    # As in pre_cheating_matches, I keep the last death time of each
+    # cheater in each match.
+    death_times = {}
+
+    for [match_id, killer_id, killed_id, death_time] in kills:
+
+        code = cheater_codes.get(killed_id)
+        if code is None:
+            continue
+
+        death_times[match_id, code] = death_time
+
+        killer_dates = cheaters.get(killer_id)
+        if killer_dates is not None and matches_start[match_id] > killer_dates[0]:
+            killed_by_cheater[code].append(matches_start[match_id])
+
+    for (match_id, code), death_time in death_times.items():
+        if match_id in earliest_3rd_kills and death_time > earliest_3rd_kills[match_id]:
+            observed_cheater[code].append(matches_start[match_id])
+
+    for exposures in killed_by_cheater + observed_cheater:
+        exposures.sort()
+
+    return {
+        'cheater_codes': cheater_codes,
+        'killed_by_cheater': killed_by_cheater,
+        'observed_cheater': observed_cheater,
+    }
+
+
+def _exposures_before_adoption(index, cheaters, exposure):
+    '''Yields, for every cheating player, their sorted exposure times, the
+    date when they started cheating, and the number of exposures before
+    that date (found by binary search).
+    '''
+
+    exposures = index[exposure]
+
+    for player_id, code in index['cheater_codes'].items():
+        times = exposures[code]
+        adoption = cheaters[player_id][0]
+        yield times, adoption, bisect_left(times, adoption)
+
+
+def adoption_latencies(index, cheaters, exposure='killed_by_cheater', since='last'):
+    '''Computes how many days after being exposed to cheating each player
+    started cheating.
+
+    Takes as argument the index returned by build_exposure_index, the
+    cheaters dictionary, the kind of exposure ('killed_by_cheater' or
+    'observed_cheater'), and whether to measure the latency since the
+    'last' or the 'first' exposure before adoption.
+
+    Returns a list of latencies in days, one for every cheating player
+    exposed before they started cheating.
+    '''
+
+    latencies = []
+    for times, adoption, before in _exposures_before_adoption(index, cheaters, exposure):
+        if before:
+            exposure_time = times[before - 1] if since == 'last' else times[0]
+            latencies.append((adoption - exposure_time) / ONE_DAY)
+    return latencies
+
+
+def windowed_adopters(index, cheaters, windows=WINDOWS, exposure='killed_by_cheater'):
+    '''Counts the players who started cheating within a number of days
+    after being exposed to cheating.
+
+    Takes as argument the index returned by build_exposure_index, the
+    cheaters dictionary, a list of windows (in days; None for no limit,
+    which gives the same counts as counter_victim_cheaters or
+    get_observer_cheaters), and the kind of exposure.
+
+    Returns a dictionary pairing each window with the number of players.
+    '''
+
+    latencies = adoption_latencies(index, cheaters, exposure)
+    return {window: sum(1 for latency in latencies if window is None or latency <= window)
+            for window in windows}
+
+
+def exposure_latencies(index, cheaters):
+    '''Returns a dictionary pairing each kind of exposure with the
+    latencies since the last exposure (see adoption_latencies).
+    '''
+
+    return {exposure: adoption_latencies(index, cheaters, exposure) for exposure in EXPOSURES}
+
+
+def _window_suffix(window):
+    '''Returns the suffix of the name of a windowed count.'''
+
+    return '_ever' if window is None else '_within_' + str(window) + 'd'
+
+
+def latency_statistics(latencies, statistics):
+    '''Computes the exposure statistics in a list of statistic names (e.g.
+    'killed_by_cheater_within_3d' or 'observed_cheater_mean_latency') from
+    the latencies between exposure and adoption. Other names in the list
+    are ignored, and the windows are taken from the names themselves.
+
+    Takes as argument a dictionary pairing each kind of exposure with the
+    list (or array) of latencies in days (as returned by
+    exposure_latencies, or by the vectorized engine), and the list of
+    names.
+
+    Returns a dictionary pairing each exposure statistic with its value.
+    '''
+
+    windows = _statistic_windows(statistics)
+    values = {}
+
+    for exposure, lst in latencies.items():
+        lst = np.asarray(lst, dtype=np.float64)
+        for window in windows:
+            values[exposure + _window_suffix(window)] = len(lst) if window is None else \
+                int(np.count_nonzero(lst <= window))
+        values[exposure + '_mean_latency'] = float(lst.mean()) if len(lst) else 0.0
+
+    return {name: values[name] for name in statistics if name in values}
+
+
+def exposure_statistic_names(windows=WINDOWS):
+    '''Returns the names of the statistics given by exposure_statistics
+    for a list of windows in days.
+    '''
+
+    names = []
+    for exposure in EXPOSURES:
+        names += [exposure + _window_suffix(window) for window in windows]
+        names.append(exposure + '_mean_latency')
+    return names
+
+
+def is_exposure_statistic(name):
+    '''Returns whether a statistic name is one of exposure_statistics.'''
+
+    return name.startswith(tuple(exposure + '_' for exposure in EXPOSURES))
+
+
+def exposure_dtypes(statistics):
+    '''Returns a dictionary pairing the exposure statistics which are not
+    counts (the mean latencies) with the numpy dtype of their replicates,
+    for allocate_replicates.
+
+    These stay in float64: the observed mean is a float64, and rounding the
+    replicates to float32 would break the ties which the p-values count
+    (e.g. the same latencies in both).
+    '''
+
+    return {name: 'float64' for name in statistics
+            if is_exposure_statistic(name) and name.endswith('_mean_latency')}
+
+
+def _statistic_windows(statistics):
+    '''Returns the windows (in days, or None for no limit) of the
+    windowed counts in a list of statistic names.
+    '''
+
+    windows = []
+    for name in statistics:
+        match = _WINDOWED_NAME.fullmatch(name)
+        if match:
+            window = None if match.group(2) is None else int(match.group(2))
+            if window not in windows:
+                windows.append(window)
+    return windows
+
+
+@instrumented('exposure_values', rows=None)
+def exposure_values(kills, cheaters, statistics):
+    '''Computes the exposure statistics in a list of statistic names on a
+    list of kills (the original or a randomized one), as
+    latency_statistics does.
+    '''
+
+    return latency_statistics(exposure_latencies(build_exposure_index(kills, cheaters), cheaters), statistics)
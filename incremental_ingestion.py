@@ -0,0 +1,412 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+'''
+This module provides functions for updating the three analyses
+incrementally, as new days of kills and team assignments arrive,
+instead of recomputing them over the full history every time.
+
+All the intermediate results (match index, pre-cheating deaths of each
+player, earliest 3rd kill of each match, and cheater counts of each team)
+are kept in a single dictionary (the state), which can be saved to and
+loaded from disk between updates.
+
+That the counts are the same as those of the batch functions can be
+checked on a generated dataset with:
+
+    python incremental_ingestion.py --check
+'''
+
+import argparse
+import os
+import pickle
+import tempfile
+from collections import defaultdict
+from datetime import timedelta
+
+from cheaters_interactions import match_earliest_3rd_kill
+
+
+def new_state():
+    '''Creates an empty state for the incremental analyses.
+
+    Returns a dictionary holding the cheaters dictionary, the index of
+    kills per match, the matches played by each player, the starting
+    time of each match, the pre-cheating deaths of each player, the
+    earliest 3rd kill of each match, the matches which make each player
+    a 'victim cheater' or an 'observer cheater', and the team counters.
+    '''
+
+    # I only use defaultdicts of built-in types (and no lambdas), so that
+    # the state can be saved with pickle.
+    state = {
+        'cheaters': {},
+        'match_kills': defaultdict(list),
+        'player_matches': defaultdict(set),
+        'matches_start': {},
+        'pre_cheating_matches': defaultdict(dict),
+        'match_earliest_3rd_kill': {},
+        'victim_matches': defaultdict(set),
+        'observer_matches': defaultdict(set),
+        'teams_cheaters': defaultdict(int),
+        'unique_teams': set(),
+        'player_teams': defaultdict(list),
+        'teams_histogram': defaultdict(int),
+    }
+    return state
+
+
+def save_state(state, path):
+    '''Saves the state of the incremental analyses to a file.
+
+    Takes as argument a state dictionary and the path of the file.
+    '''
+
+    with open(path, 'wb') as state_file:
+        pickle.dump(state, state_file, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def load_state(path):
+    '''Loads a state previously saved with save_state.
+
+    Takes as argument the path of the file, and returns the state
+    dictionary.
+    '''
+
+    with open(path, 'rb') as state_file:
+        return pickle.load(state_file)
+
+
+def _discard_evidence(evidence, player_id, match_id):
+    '''Removes a match from the evidence set of a player, and removes the
+    player altogether when no evidence is left. This way, the number of
+    players in the dictionary is always the number of counted players.
+    '''
+
+    matches = evidence.get(player_id)
+    if matches is not None:
+        matches.discard(match_id)
+        if not matches:
+            del evidence[player_id]
+
+
+def reevaluate_match(state, match_id):
+    '''Recomputes the contribution of a single match to the 'victim
+    cheaters' and 'observer cheaters' counts.
+
+    Takes as argument a state dictionary and a match id. The kills of
+    the match are taken from the match index in the state, in the order
+    in which they were ingested, so that the results are the same as
+    those of the functions in cheaters_interactions over the full history.
+    '''
+
+    cheaters = state['cheaters']
+    kills = state['match_kills'][match_id]
+    pre_cheating_matches = state['pre_cheating_matches']
+    victim_matches = state['victim_matches']
+    observer_matches = state['observer_matches']
+
+    # Firstly, I remove whatever this match contributed before.
+    players = _match_players(kills)
+    for player_id in players:
+        _discard_evidence(victim_matches, player_id, match_id)
+        _discard_evidence(observer_matches, player_id, match_id)
+        history = pre_cheating_matches.get(player_id)
+        if history is not None:
+            history.pop(match_id, None)
+            if not history:
+                del pre_cheating_matches[player_id]
+    state['match_earliest_3rd_kill'].pop(match_id, None)
+
+    match_start = state['matches_start'][match_id]
+    kills_per_cheater = defaultdict(list)
+
+    # Then, I go through the kills of the match once, applying the same
+    # conditions as counter_victim_cheaters, pre_cheating_matches and
+    # match_kills_per_cheater.
+    for [killer_id, killed_id, death_time] in kills:
+
+        try:
+            if match_start < cheaters[killed_id][0]:
+                pre_cheating_matches[killed_id][match_id] = death_time
+                if match_start > cheaters[killer_id][0]:
+                    victim_matches[killed_id].add(match_id)
+        except KeyError:
+            pass
+
+        try:
+            if cheaters[killer_id][0] > match_start:
+                kills_per_cheater[killer_id].append(death_time)
+        except KeyError:
+            pass
+
+    # Finally, I register the earliest 3rd kill of the match, and the
+    # not yet cheating players who died after it.
+    earliest_3rd_kill = match_earliest_3rd_kill({match_id: kills_per_cheater}).get(match_id)
+    if earliest_3rd_kill is not None:
+        state['match_earliest_3rd_kill'][match_id] = earliest_3rd_kill
+        for player_id in players:
+            death_time = pre_cheating_matches.get(player_id, {}).get(match_id)
+            if death_time is not None and death_time > earliest_3rd_kill:
+                observer_matches[player_id].add(match_id)
+
+
+def _match_players(kills):
+    '''Returns the set of players (killers and killed) in a list of kills
+    of a single match.
+    '''
+
+    players = set()
+    for [killer_id, killed_id, death_time] in kills:
+        players.add(killer_id)
+        players.add(killed_id)
+    return players
+
+
+def _change_team_count(state, unique_team_id, delta):
+    '''Adds delta to the number of cheaters of a team, keeping the
+    histogram of teams per number of cheaters up to date.
+    '''
+
+    teams_cheaters = state['teams_cheaters']
+    teams_histogram = state['teams_histogram']
+
+    old_count = teams_cheaters[unique_team_id]
+    new_count = old_count + delta
+
+    if old_count:
+        teams_histogram[old_count] -= 1
+    if new_count:
+        teams_histogram[new_count] += 1
+        teams_cheaters[unique_team_id] = new_count
+    else:
+        del teams_cheaters[unique_team_id]
+
+
+def ingest_kills(state, kills):
+    '''Appends a new batch of kills (typically one day of matches) to the
+    state, and updates the 'victim cheaters' and 'observer cheaters'.
+
+    Takes as argument a state dictionary and a list of kills, in the
+    same format as the one returned by get_kills. Only the matches
+    appearing in the new kills are re-evaluated, so the time taken is
+    proportional to the new data.
+    '''
+
+    match_kills = state['match_kills']
+    player_matches = state['player_matches']
+    matches_start = state['matches_start']
+    touched_matches = set()
+
+    for [match_id, killer_id, killed_id, death_time] in kills:
+
+        match_kills[match_id].append([killer_id, killed_id, death_time])
+        player_matches[killer_id].add(match_id)
+        player_matches[killed_id].add(match_id)
+
+        # A match may span several batches (e.g. around midnight), in
+        # which case its starting time can still move backwards.
+        if match_id not in matches_start or matches_start[match_id] > death_time:
+            matches_start[match_id] = death_time
+
+        touched_matches.add(match_id)
+
+    for match_id in touched_matches:
+        reevaluate_match(state, match_id)
+
+
+def ingest_teams(state, teams):
+    '''Appends a new batch of team assignments to the state, and updates
+    the number of cheaters per team.
+
+    Takes as argument a state dictionary and a list of teams, in the
+    same format as the one returned by get_teams.
+    '''
+
+    cheaters = state['cheaters']
+    unique_teams = state['unique_teams']
+    player_teams = state['player_teams']
+
+    for [match_id, player_id, team_number] in teams:
+
+        unique_team_id = match_id + ' - ' + team_number
+
+        unique_teams.add(unique_team_id)
+        player_teams[player_id].append(unique_team_id)
+
+        if player_id in cheaters:
+            _change_team_count(state, unique_team_id, 1)
+
+
+def update_cheaters(state, cheaters):
+    '''Adds new cheating players, or new starting and banning dates for
+    known ones, to the state.
+
+    Takes as argument a state dictionary and a dictionary in the same
+    format as the one returned by get_cheaters (it can contain only the
+    changed entries). Only the teams and matches of the affected players
+    are re-evaluated.
+    '''
+
+    known_cheaters = state['cheaters']
+    affected_matches = set()
+
+    for player_id, dates in cheaters.items():
+
+        if known_cheaters.get(player_id) == dates:
+            continue
+
+        # Team counters only depend on whether a player is a cheater,
+        # not on when they started cheating.
+        if player_id not in known_cheaters:
+            for unique_team_id in state['player_teams'].get(player_id, ()):
+                _change_team_count(state, unique_team_id, 1)
+
+        known_cheaters[player_id] = dates
+        affected_matches.update(state['player_matches'].get(player_id, ()))
+
+    for match_id in affected_matches:
+        reevaluate_match(state, match_id)
+
+
+def incremental_cheater_counters(state):
+    '''Returns five integers, which are the number of teams with 0, 1, 2,
+    3, or 4 cheaters, as get_cheater_counters would over all the teams
+    ingested so far.
+    '''
+
+    teams_histogram = state['teams_histogram']
+
+    one_cheater = teams_histogram.get(1, 0)
+    two_cheaters = teams_histogram.get(2, 0)
+    three_cheaters = teams_histogram.get(3, 0)
+    four_cheaters = teams_histogram.get(4, 0)
+
+    zero_cheaters = len(state['unique_teams']) - (one_cheater + two_cheaters + three_cheaters + four_cheaters)
+
+    return zero_cheaters, one_cheater, two_cheaters, three_cheaters, four_cheaters
+
+
+def incremental_victim_cheaters(state):
+    '''Returns the number of players which started cheating after being
+    killed by an actively cheating player, over all the kills ingested
+    so far.
+    '''
+
+    return len(state['victim_matches'])
+
+
+def incremental_observer_cheaters(state):
+    '''Returns the number of players which started cheating after
+    observing a cheating player get at least 3 kills in a match, over
+    all the kills ingested so far.
+    '''
+
+    return len(state['observer_matches'])
+
+
+def _state_counters(state):
+    '''Returns the counts of the three analyses on a state.'''
+
+    return incremental_cheater_counters(state), incremental_victim_cheaters(state), \
+        incremental_observer_cheaters(state)
+
+
+def check_incremental(data_dir, workers=2):
+    '''Checks that the incremental counts are the same as those of the
+    batch functions (get_cheater_counters, counter_victim_cheaters and
+    get_observer_cheaters), on the data files in a folder.
+
+    The kills are ingested one day at a time (so that matches around
+    midnight are split between days), with half the cheaters known at the
+    start, the state saved and loaded between days, and the starting date
+    of one cheater moved at the end. The files are also loaded with
+    load_pipelined.
+
+    Takes as argument the folder, and the number of worker processes of
+    the pipelined loading. Returns a list with a description of every
+    count which differs (empty if the check passes).
+    '''
+
+    # Imported here, since they are only needed by the check (and
+    # pipelined_loading itself relies on this module).
+    from reading_files import get_cheaters, get_teams, get_kills
+    from cheaters_teaming_up import get_cheater_counters
+    from cheaters_interactions import match_starting_time, counter_victim_cheaters, get_observer_cheaters
+    from pipelined_loading import load_pipelined
+
+    def batch_counters(cheaters):
+        return get_cheater_counters(cheaters, teams), \
+            counter_victim_cheaters(kills, match_starting_time(kills), cheaters), \
+            get_observer_cheaters(cheaters, kills)
+
+    paths = [os.path.join(data_dir, name) for name in ['cheaters.txt', 'team_ids.txt', 'kills.txt']]
+    cheaters = get_cheaters(paths[0])
+    teams = get_teams(paths[1])
+    kills = get_kills(paths[2])
+    mismatches = []
+
+    days = sorted({kill[3].date() for kill in kills})
+    known_cheaters = list(cheaters.items())
+
+    with tempfile.TemporaryDirectory() as state_dir:
+        state_path = os.path.join(state_dir, 'state.pickle')
+
+        state = new_state()
+        update_cheaters(state, dict(known_cheaters[:len(known_cheaters) // 2]))
+        ingest_teams(state, teams)
+
+        for day in days:
+            ingest_kills(state, [kill for kill in kills if kill[3].date() == day])
+            save_state(state, state_path)
+            state = load_state(state_path)
+
+        update_cheaters(state, dict(known_cheaters[len(known_cheaters) // 2:]))
+
+    if _state_counters(state) != batch_counters(cheaters):
+        mismatches.append('incremental counts')
+
+    # The cheater who started last is found to have been cheating since
+    # before the first kill, which changes the matches where they were
+    # exposed to cheating, and those where they cheated.
+    player_id, dates = max(known_cheaters, key=lambda cheater: cheater[1][0])
+    changed_cheaters = dict(cheaters)
+    changed_cheaters[player_id] = [min(kill[3] for kill in kills) - timedelta(days=1)] + dates[1:]
+    update_cheaters(state, {player_id: changed_cheaters[player_id]})
+
+    if _state_counters(state) != batch_counters(changed_cheaters):
+        mismatches.append('incremental counts after a change of starting date')
+
+    if _state_counters(load_pipelined(*paths, workers=workers)) != batch_counters(cheaters):
+        mismatches.append('pipelined counts')
+
+    return mismatches
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Check that the incremental counts match the batch ones.')
+    parser.add_argument('--check', action='store_true', required=True,
+                        help='compare the incremental, pipelined and batch counts on a dataset')
+    parser.add_argument('--data-dir', default=None,
+                        help='folder with the data files (by default, a dataset is generated)')
+    parser.add_argument('--kills', type=int, default=20000, help='number of kills of the generated dataset')
+    parser.add_argument('--seed', type=int, default=0, help='random seed')
+    args = parser.parse_args()
+
+    # Imported here, since it is only needed to generate the data.
+    from data_generator import generate_dataset
+
+    with tempfile.TemporaryDirectory() as temporary_dir:
+        data_dir = args.data_dir
+        if data_dir is None:
+            data_dir = temporary_dir
+            generate_dataset(data_dir, args.kills, cheater_rate=0.1, seed=args.seed)
+        mismatches = check_incremental(data_dir)
+
+    if mismatches:
+        raise SystemExit('the counts differ from the batch ones: ' + ', '.join(mismatches))
+    print('incremental and pipelined counts match the batch ones')
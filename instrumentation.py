@@ -0,0 +1,268 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+'''
+This module provides an opt-in instrumentation layer for the analyses.
+Once enabled, every stage of the pipeline (loading, randomization,
+counting and simulation) records its wall time, CPU time, peak memory,
+number of rows processed and, for simulations, the duration of each
+replicate.
+
+Records can be collected as a list of dictionaries, written as JSON,
+or handed to a callback as soon as each stage finishes. While disabled
+(the default), each stage only pays for one extra function call.
+'''
+
+import functools
+import inspect
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+
+_enabled = False
+_memory = False
+_callback = None
+_records = []
+
+# Whether enable started tracemalloc, in which case disable stops it (and
+# otherwise leaves it running for whoever started it, e.g. benchmark).
+_started_tracing = False
+
+# Stack of the stages currently running, used to compute the peak memory
+# of nested stages (e.g. get_shuffled_kills inside a simulation).
+_running_stages = []
+
+
+def enable(callback=None, memory=False):
+    '''Turns on the instrumentation of every stage.
+
+    Takes as argument an optional function, which is called with each
+    record (a dictionary) as soon as the stage finishes, and whether to
+    measure peak memory (which uses tracemalloc, and slows the code down).
+    '''
+
+    global _enabled, _memory, _callback, _started_tracing
+
+    _enabled = True
+    _callback = callback
+    _memory = memory
+
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _started_tracing = True
+
+
+def disable():
+    '''Turns off the instrumentation. Records collected so far are kept.'''
+
+    global _enabled, _memory, _callback, _started_tracing
+
+    if _started_tracing and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _started_tracing = False
+
+    _enabled = False
+    _memory = False
+    _callback = None
+
+
+def is_enabled():
+    '''Returns whether the instrumentation is turned on.'''
+
+    return _enabled
+
+
+def get_records():
+    '''Returns the list of records collected so far, in the order in
+    which the stages finished.
+    '''
+
+    return _records
+
+
+def clear_records():
+    '''Deletes the records collected so far.'''
+
+    del _records[:]
+
+
+def records_to_json(path=None):
+    '''Returns the records collected so far as a JSON string, and also
+    writes it to a file if a path is given.
+    '''
+
+    text = json.dumps(_records, indent=2)
+
+    if path is not None:
+        with open(path, 'w') as file:
+            file.write(text)
+
+    return text
+
+
+def _enter_stage():
+    '''Registers the start of a stage, and returns the dictionary where
+    its starting measurements are stored.
+    '''
+
+    running_stage = {'wall_start': time.perf_counter(), 'cpu_start': time.process_time()}
+
+    if _memory:
+        # tracemalloc only keeps one peak, so before resetting it for the
+        # new stage I pass the peak reached so far to the enclosing stage.
+        current_memory, peak_memory = tracemalloc.get_traced_memory()
+        if _running_stages:
+            _running_stages[-1]['max_peak'] = max(_running_stages[-1]['max_peak'], peak_memory)
+        tracemalloc.reset_peak()
+        running_stage['start_memory'] = current_memory
+        running_stage['max_peak'] = current_memory
+
+    _running_stages.append(running_stage)
+    return running_stage
+
+
+def _exit_stage(name, rows, details):
+    '''Registers the end of the innermost running stage, storing its
+    record and handing it to the callback.
+    '''
+
+    running_stage = _running_stages.pop()
+
+    record = {
+        'stage': name,
+        'wall_time': time.perf_counter() - running_stage['wall_start'],
+        'cpu_time': time.process_time() - running_stage['cpu_start'],
+        'rows': rows,
+        'depth': len(_running_stages),
+    }
+    record.update(details)
+
+    if _memory:
+        peak_memory = max(running_stage['max_peak'], tracemalloc.get_traced_memory()[1])
+        record['peak_memory'] = peak_memory - running_stage['start_memory']
+        if _running_stages:
+            _running_stages[-1]['max_peak'] = max(_running_stages[-1]['max_peak'], peak_memory)
+
+    _store_record(record)
+
+
+def _store_record(record):
+    '''Stores a record and hands it to the callback.'''
+
+    _records.append(record)
+
+    if _callback is not None:
+        _callback(record)
+
+
+def add_record(name, wall_time, cpu_time, rows=None, **details):
+    '''Stores the record of a stage measured somewhere else (e.g. a
+    replicate run in a worker process), as a stage of the one currently
+    running. Does nothing when the instrumentation is off.
+
+    Takes as argument the name of the stage, its wall and CPU times in
+    seconds, optionally the number of rows it processed, and any further
+    details to store in its record.
+    '''
+
+    if not _enabled:
+        return
+
+    record = {
+        'stage': name,
+        'wall_time': wall_time,
+        'cpu_time': cpu_time,
+        'rows': rows,
+        'depth': len(_running_stages),
+    }
+    record.update(details)
+
+    _store_record(record)
+
+
+@contextmanager
+def stage(name, rows=None, **details):
+    '''Context manager measuring the block of code it wraps as a stage.
+
+    Takes as argument the name of the stage, optionally the number of
+    rows it processes, and any further details to store in its record
+    (e.g. the index of a simulation replicate).
+    '''
+
+    if not _enabled:
+        yield
+        return
+
+    _enter_stage()
+    try:
+        yield
+    finally:
+        _exit_stage(name, rows, details)
+
+
+def _count_rows(rows, argument, args, kwargs, output):
+    '''Returns the number of rows processed by a stage: the length of one
+    of its arguments (given by its index, or by its name if it was passed
+    by keyword), or the length of its output (if rows is 'output'), or None
+    if it has no length.
+    '''
+
+    if rows is None:
+        return None
+
+    if rows == 'output':
+        data = output
+    elif rows < len(args):
+        data = args[rows]
+    elif argument in kwargs:
+        data = kwargs[argument]
+    else:
+        return None
+
+    try:
+        return len(data)
+    except TypeError:
+        return None
+
+
+def instrumented(name, rows=0):
+    '''Decorator which turns a function into an instrumented stage.
+
+    Takes as argument the name of the stage, and where to find the number
+    of rows it processes: the index of a positional argument (by default,
+    the first one), 'output' for the length of its output, or None.
+    '''
+
+    def decorator(function):
+
+        # The name of the argument counted, in case it is passed by keyword.
+        argument = None
+        if isinstance(rows, int):
+            parameters = list(inspect.signature(function).parameters)
+            if rows < len(parameters):
+                argument = parameters[rows]
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+
+            # When the instrumentation is off, the function is called
+            # straight away, so the overhead is a single check.
+            if not _enabled:
+                return function(*args, **kwargs)
+
+            _enter_stage()
+            output = None
+            try:
+                output = function(*args, **kwargs)
+                return output
+            finally:
+                _exit_stage(name, _count_rows(rows, argument, args, kwargs, output), {})
+
+        return wrapper
+
+    return decorator
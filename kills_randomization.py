@@ -13,7 +13,10 @@ in a match.
 from collections import defaultdict
 import random
 
+from instrumentation import instrumented
 
+
+@instrumented('players_per_match')
 def players_per_match(kills):
     ''' Creates a dictionary with a set of participating players for
     each match.
@@ -35,13 +38,15 @@ def players_per_match(kills):
     return match_players
 
 
-def players_shuffle(match_players):
+@instrumented('players_shuffle')
+def players_shuffle(match_players, rng=random):
     ''' Randomly shuffles an ordered list of players in each match,
     associating the newly shuffled list of players with the original
     list of players.
     
     Takes as argument a dictionary in which keys are match ids, and
-    values are sets of player ids.
+    values are sets of player ids, and optionally a random generator (by
+    default, the global one of the random module).
     
     Returns a dictionary in which keys are match ids, and values are
     dictionaries (for which the keys are player ids, and values are
@@ -50,10 +55,13 @@ def players_shuffle(match_players):
 
     for key, value in match_players.items():
         
-        # Firstly, I create the lists of original and shuffled ids.
-        original_ids = list(value)
+        # Firstly, I create the lists of original and shuffled ids. I sort
+        # the ids, since the order of a set changes from one Python session
+        # to another, and the shuffle would then not be reproducible from
+        # a seed.
+        original_ids = sorted(value)
         shuffled_ids = original_ids[:]
-        random.shuffle(shuffled_ids)
+        rng.shuffle(shuffled_ids)
         
         # I set the value (for each key/match) to an empty dictionary, of type string.
         match_players[key] = defaultdict()
@@ -65,6 +73,7 @@ def players_shuffle(match_players):
     return match_players
 
 
+@instrumented('kills_updating', rows=1)
 def kills_updating(match_players, kills):
     ''' Updates list of kills, replacing original acocunt ids by the
     associated account ids post-shuffle.
@@ -95,19 +104,21 @@ def kills_updating(match_players, kills):
     return kills
 
 
-def get_shuffled_kills(kills):
+@instrumented('get_shuffled_kills')
+def get_shuffled_kills(kills, rng=random):
     ''' Executes the defined functions necessary to obtain a list of kills
     after randomization of player roles within matches.
     
     Takes as argument an original list of kills, where elements are lists
     with match id, killing player account id, killed player account id,
-    and time of death.
+    and time of death, and optionally a random generator (e.g. a
+    random.Random with its own seed).
     
     Returns a new list of kills, with randomized player role allocations.
     '''
     
     match_players = players_per_match(kills)
-    match_players = players_shuffle(match_players)
+    match_players = players_shuffle(match_players, rng)
     kills = kills_updating(match_players, kills)
     
     return kills
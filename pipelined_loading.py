@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+'''
+This module provides a pipelined way of loading the data, in which
+reading (and decompressing) the files, parsing the lines, and updating
+the counters of the analyses all happen at the same time.
+
+A background thread reads each file in chunks of lines, a pool of worker
+processes parses the chunks, and the parsed batches are handed, in their
+original order, to the incremental counters of incremental_ingestion.
+Queues between the stages are bounded, so a slow stage makes the faster
+ones wait instead of filling up the memory.
+'''
+
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from instrumentation import instrumented
+from reading_files import CHEATERS_PATH, TEAMS_PATH, KILLS_PATH, open_data_file, parse_cheater_lines, \
+    parse_team_lines, parse_kill_lines
+from incremental_ingestion import new_state, update_cheaters, ingest_teams, ingest_kills
+
+
+CHUNK_SIZE = 50000
+
+# Marks the end of a file in the queue of chunks.
+_END_OF_FILE = object()
+
+
+def _read_chunks(path, chunk_size, chunks, stop):
+    '''Reads a file in chunks of chunk_size lines, and puts them in a
+    queue. Runs in a background thread.
+
+    Errors are put in the queue too, so that they are raised by the
+    thread consuming the chunks.
+    '''
+
+    def put(item):
+        # When the queue is full, I wait for a free slot, checking now and
+        # then whether the consumer has given up.
+        while not stop.is_set():
+            try:
+                chunks.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    try:
+        with open_data_file(path) as file:
+            chunk = []
+            for line in file:
+                chunk.append(line)
+                if len(chunk) == chunk_size:
+                    if not put(chunk):
+                        return
+                    chunk = []
+            if chunk and not put(chunk):
+                return
+        put(_END_OF_FILE)
+
+    except Exception as error:
+        put(error)
+
+
+def start_reader(path, chunk_size=CHUNK_SIZE, max_queued=4):
+    '''Starts reading a file in a background thread.
+
+    Takes as argument the path of the file, the number of lines per chunk,
+    and the maximum number of chunks read ahead of the consumer.
+
+    Returns a tuple with the queue of chunks and the event which stops the
+    reader.
+    '''
+
+    chunks = queue.Queue(maxsize=max_queued)
+    stop = threading.Event()
+
+    reader = threading.Thread(target=_read_chunks, args=(path, chunk_size, chunks, stop), daemon=True)
+    reader.start()
+
+    return chunks, stop
+
+
+def parsed_batches(reader, parse, executor=None, max_pending=4):
+    '''Yields the parsed batches of a file, in the order of the file.
+
+    Takes as argument the tuple returned by start_reader, the function
+    parsing a chunk of lines, an optional executor (e.g. a pool of worker
+    processes) where chunks are parsed, and the maximum number of chunks
+    being parsed at the same time.
+    '''
+
+    chunks, stop = reader
+    pending = deque()
+    end_of_file = False
+
+    try:
+        while not end_of_file or pending:
+
+            # I keep up to max_pending chunks being parsed, and only take
+            # more chunks from the reader as parsed batches are consumed.
+            while not end_of_file and len(pending) < max(1, max_pending):
+                chunk = chunks.get()
+                if chunk is _END_OF_FILE:
+                    end_of_file = True
+                elif isinstance(chunk, Exception):
+                    raise chunk
+                elif executor is None:
+                    pending.append(chunk)
+                else:
+                    pending.append(executor.submit(parse, chunk))
+
+            if pending:
+                batch = pending.popleft()
+                yield parse(batch) if executor is None else batch.result()
+
+    finally:
+        stop.set()
+
+
+@instrumented('load_pipelined', rows=None)
+def load_pipelined(cheaters_path=CHEATERS_PATH, teams_path=TEAMS_PATH, kills_path=KILLS_PATH, state=None,
+                   workers=2, chunk_size=CHUNK_SIZE, max_queued=4):
+    '''Loads the three data files through the pipeline, updating the
+    incremental counters batch by batch.
+
+    Takes as argument the paths of the three files (which can be
+    compressed), an optional state of incremental_ingestion to update (by
+    default, a new one), the number of worker processes parsing the lines
+    (0 to parse them in the main thread), the number of lines per chunk,
+    and the maximum number of chunks queued between each pair of stages.
+
+    Returns the updated state.
+    '''
+
+    if state is None:
+        state = new_state()
+
+    # Both files of matches start being read straight away, so the kills
+    # are already being read while the teams are being counted.
+    teams_reader = start_reader(teams_path, chunk_size, max_queued)
+    kills_reader = start_reader(kills_path, chunk_size, max_queued)
+
+    executor = ProcessPoolExecutor(workers) if workers > 0 else None
+
+    try:
+        # The cheaters are needed before the matches, and the file is small.
+        with open_data_file(cheaters_path) as file:
+            update_cheaters(state, parse_cheater_lines(file))
+
+        for batch in parsed_batches(teams_reader, parse_team_lines, executor, max_queued):
+            ingest_teams(state, batch)
+
+        for batch in parsed_batches(kills_reader, parse_kill_lines, executor, max_queued):
+            ingest_kills(state, batch)
+
+    finally:
+        teams_reader[1].set()
+        kills_reader[1].set()
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    return state
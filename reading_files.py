@@ -6,54 +6,134 @@
 
 '''
 This module provides the necessary functions for translating
-data from original .txt files into python objects, namely dictionaries
-and lists.
+data from original .txt files (optionally compressed) into python
+objects, namely dictionaries and lists.
 '''
 
+import bz2
+import gzip
+import hashlib
+import lzma
+import os
 from datetime import datetime
 
+from instrumentation import instrumented
 
-def get_cheaters():
+
+# The data files are expected in a folder next to the notebook. The paths
+# are built with os.path.join so that they work on any operating system.
+DATA_DIR = 'assignment-final-data'
+CHEATERS_PATH = os.path.join(DATA_DIR, 'cheaters.txt')
+TEAMS_PATH = os.path.join(DATA_DIR, 'team_ids.txt')
+KILLS_PATH = os.path.join(DATA_DIR, 'kills.txt')
+
+
+def open_data_file(path):
+    '''Opens a data file for reading as text. Files ending in .gz, .bz2
+    or .xz are decompressed on the fly.
+    '''
+    
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt')
+    if path.endswith('.bz2'):
+        return bz2.open(path, 'rt')
+    if path.endswith('.xz'):
+        return lzma.open(path, 'rt')
+    return open(path, 'r')
+
+
+def dataset_fingerprint(paths):
+    '''Returns a fingerprint (a SHA-256 hex digest) of the contents of a
+    list of data files, used to check that two processes are working on
+    exactly the same data.
+    '''
+    
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b''):
+                digest.update(block)
+        # I separate the files, so that moving lines from the end of one file
+        # to the start of the next one changes the fingerprint.
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def parse_cheater_lines(lines):
+    '''Translates lines of cheaters.txt into a dictionary pairing the
+    account id of each cheating player with a list of the date when they
+    started cheating and the date when they were banned.
+    '''
+    
+    data = {}
+    for line in lines:
+        entry = line.strip().split('\t')
+        data[entry[0]] = [datetime.strptime(entry[1], '%Y-%m-%d'), datetime.strptime(entry[2], '%Y-%m-%d')]
+    return data
+
+
+def parse_team_lines(lines):
+    '''Translates lines of team_ids.txt into a list of lists with the
+    match id, the player account id, and the team number.
+    '''
+    
+    data = []
+    for line in lines:
+        data.append(line.strip().split('\t'))
+    return data
+
+
+def parse_kill_lines(lines):
+    '''Translates lines of kills.txt into a list of lists with the match
+    id, the account id of the killer, the account id of the killed player,
+    and the time at which the kill took place.
+    '''
+    
+    data = []
+    for line in lines:
+        entry = line.strip().split('\t')
+        data.append([entry[0], entry[1], entry[2], datetime.strptime(entry[3], '%Y-%m-%d %H:%M:%S.%f')])
+    return data
+
+
+@instrumented('get_cheaters', rows='output')
+def get_cheaters(path=CHEATERS_PATH):
     '''Opens file cheaters.txt and returns a dictionary of cheating players.
     Each key is the account id of a cheating player. The value for each key
     is a list with two elements. The two elements are the date when they
     started cheating, and the date when they were banned for cheating.
     
-    Takes a text file as argument, and returns a dictionary as the output.
+    Takes the path of the text file as argument (by default, the one in the
+    data folder), and returns a dictionary as the output.
     '''
     
-    data = {}
-    for line in open('assignment-final-data\cheaters.txt', 'r'):
-        entry = line.strip().split('\t')
-        data[entry[0]] = [datetime.strptime(entry[1], '%Y-%m-%d'), datetime.strptime(entry[2], '%Y-%m-%d')]
-    return data 
+    with open_data_file(path) as file:
+        return parse_cheater_lines(file)
 
 
-def get_teams():
+@instrumented('get_teams', rows='output')
+def get_teams(path=TEAMS_PATH):
     '''Opens file teams.txt and returns a list of team id's for players
     in different matches. Each entry of the list consists of a list
     with the match id, the player account id, and the team number.
     
-    Takes a text file as argument, and returns a list as the output.
+    Takes the path of the text file as argument (by default, the one in the
+    data folder), and returns a list as the output.
     '''
     
-    data = []
-    for line in open(r'assignment-final-data\team_ids.txt', 'r'):
-        data.append(line.strip().split('\t'))
-    return data 
+    with open_data_file(path) as file:
+        return parse_team_lines(file)
 
 
-def get_kills():
+@instrumented('get_kills', rows='output')
+def get_kills(path=KILLS_PATH):
     '''Opens file kills.txt and returns a list of kills, which are identified
     as lists of the match id, the account id of the killer, the account id
     of the killed player, and the time at which the kill took place.
     
-    Takes a text file as argument, and returns the list as the output.
+    Takes the path of the text file as argument (by default, the one in the
+    data folder), and returns the list as the output.
     '''
     
-    data = []
-    for line in open('assignment-final-data\kills.txt', 'r'):
-        entry = line.strip().split('\t')
-        data.append([entry[0], entry[1], entry[2], datetime.strptime(entry[3], '%Y-%m-%d %H:%M:%S.%f')])
-    return data 
-
+    with open_data_file(path) as file:
+        return parse_kill_lines(file)
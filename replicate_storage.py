@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+'''
+This module provides functions for storing the values of the randomized
+replicates in preallocated numpy arrays, one per statistic, instead of
+Python lists.
+
+The arrays can live in memory, or be written to a folder with one .npy
+file per statistic (plus a small metadata.json file), which can later be
+read back memory-mapped to plot the full null distributions or compute
+p-values. Each count is stored in the narrowest unsigned integer dtype
+holding its largest possible value (see narrowest_dtype), so that e.g.
+10^6 replicates of the seven statistics take 14 MB with 2-byte integers,
+instead of the hundreds of MB taken by lists of Python ints.
+'''
+
+import json
+import os
+
+import numpy as np
+
+
+DEFAULT_DTYPE = 'int32'
+METADATA_FILE = 'metadata.json'
+
+
+def narrowest_dtype(bound):
+    '''Returns the name of the narrowest unsigned integer dtype holding
+    every count from 0 to bound (e.g. 'uint16' for a bound of 5000).
+    '''
+
+    return np.min_scalar_type(bound).name
+
+
+def allocate_replicates(statistics, n, directory=None, dtypes=None, metadata=None):
+    '''Preallocates one array per statistic for n replicates.
+
+    Takes as argument a list of statistic names, the number of replicates,
+    optionally a folder where the arrays are written as memory-mapped .npy
+    files, optionally a dictionary pairing statistic names with numpy
+    dtypes (by default, DEFAULT_DTYPE, which holds any count but takes
+    twice the memory of most narrowest_dtype ones), and optionally a dictionary of
+    details (e.g. the seed) stored in the metadata file of the folder.
+
+    Returns a dictionary pairing each statistic name with its array.
+    '''
+
+    dtypes = dtypes or {}
+    replicates = {}
+
+    if directory is not None:
+        os.makedirs(directory, exist_ok=True)
+
+    for name in statistics:
+        dtype = dtypes.get(name, DEFAULT_DTYPE)
+        if directory is None:
+            replicates[name] = np.zeros(n, dtype=dtype)
+        else:
+            replicates[name] = np.lib.format.open_memmap(os.path.join(directory, name + '.npy'), mode='w+',
+                                                         dtype=dtype, shape=(n,))
+
+    if directory is not None:
+        metadata_path = os.path.join(directory, METADATA_FILE)
+        folder_metadata = {'replicates': n, 'statistics': {}, 'details': {}}
+
+        # Several simulations can share a folder (e.g. the 'victim' and
+        # 'observer' simulations), so I keep the statistics already there
+        # if they have the same number of replicates.
+        if os.path.exists(metadata_path):
+            with open(metadata_path, 'r') as file:
+                existing_metadata = json.load(file)
+            if existing_metadata['replicates'] == n:
+                folder_metadata = existing_metadata
+
+        folder_metadata['statistics'].update({name: str(array.dtype) for name, array in replicates.items()})
+        folder_metadata['details'].update(metadata or {})
+
+        with open(metadata_path, 'w') as file:
+            json.dump(folder_metadata, file, indent=2)
+
+    return replicates
+
+
+def flush_replicates(replicates):
+    '''Writes to disk the arrays of a folder created by
+    allocate_replicates (arrays in memory are left as they are).
+    '''
+
+    for array in replicates.values():
+        if isinstance(array, np.memmap):
+            array.flush()
+
+
+def load_replicates(directory, mmap=True):
+    '''Reads back the arrays written by allocate_replicates.
+
+    Takes as argument the folder, and whether to memory-map the files
+    (read-only) instead of loading them into memory.
+
+    Returns a tuple with the dictionary pairing each statistic name with
+    its array, and the metadata dictionary.
+    '''
+
+    with open(os.path.join(directory, METADATA_FILE), 'r') as file:
+        metadata = json.load(file)
+
+    mmap_mode = 'r' if mmap else None
+    replicates = {name: np.load(os.path.join(directory, name + '.npy'), mmap_mode=mmap_mode)
+                  for name in metadata['statistics']}
+
+    return replicates, metadata
@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+'''
+This module provides a command-line entry point which runs the three
+analyses (cheaters teaming up, 'victim cheaters' and 'observer cheaters')
+over a single loaded dataset, without the notebook.
+
+For each statistic, it writes the observed value, and the mean, 95%
+confidence interval bounds and (two-sided) p-value of the randomized
+replicates to a JSON or CSV file, together with the time taken by each
+phase.
+
+Example:
+
+    python run_analyses.py --replicates 1000 --workers 8 --engine vectorized --output results.json
+'''
+
+import argparse
+import csv
+import json
+import time
+
+import instrumentation
+from reading_files import CHEATERS_PATH, TEAMS_PATH, KILLS_PATH
+from statistical_methods import mean, confidence_bounds, p_value
+from simulations_cheating import ENGINES, STATISTICS, load_data, data_fingerprint, observed_latencies, \
+    observed_statistics, replicate_dtypes, run_replicates
+from replicate_storage import allocate_replicates
+from distributed_replicates import MAX_CHUNK_SIZE, TIMEOUT, parse_address
+from exposure_index import exposure_statistic_names
+
+
+RESULT_FIELDS = ['statistic', 'observed', 'mean', 'ci_lower', 'ci_upper', 'p_value']
+
+
+def summarize(observed, replicates):
+    '''Summarizes the observed values and the replicates of each statistic.
+
+    Takes as argument a dictionary pairing statistic names with observed
+    values, and a dictionary pairing them with lists of replicate values.
+
+    Returns a list of dictionaries, one per statistic, with the fields in
+    RESULT_FIELDS.
+    '''
+
+    results = []
+    for name, values in replicates.items():
+        ci_lower, ci_upper = confidence_bounds(values)
+        results.append({
+            'statistic': name,
+            'observed': observed[name],
+            'mean': mean(values),
+            'ci_lower': ci_lower,
+            'ci_upper': ci_upper,
+            # Some observed values are above the randomized ones (e.g. teams
+            # with several cheaters) and some below (e.g. teams with no
+            # cheater), so the p-value is two-sided.
+            'p_value': p_value(observed[name], values, 'two-sided'),
+        })
+    return results
+
+
+def run_analyses(cheaters_path, teams_path, kills_path, replicates=20, seed=0, workers=1, engine='python',
+                 hosts=None, exposure_windows=None, replicates_dir=None, chunk_size=None, timeout=None):
+    '''Loads the data once and runs the three analyses over it.
+
+    Takes as argument the paths of the three data files, the number of
+    replicates, a seed, the number of worker processes, the engine,
+    optionally a list of (host, port) addresses of remote workers, and
+    optionally a list of windows (in days) for the exposure analysis of
+    exposure_index, optionally a folder where the value of every
+    replicate is kept (see replicate_storage), and the number of
+    replicates per task and timeout in seconds of the remote workers (see
+    run_distributed).
+
+    Returns a dictionary with the parameters, the results (as returned by
+    summarize), the observed latencies between exposure and adoption (if
+    requested), and the wall time of each phase in seconds.
+    '''
+
+    timings = {}
+
+    start = time.perf_counter()
+    data = load_data(cheaters_path, teams_path, kills_path, engine)
+    timings['load'] = time.perf_counter() - start
+
+    # The exposure statistics are computed alongside the others, on the
+    # same randomized kills of each replicate.
+    statistics = STATISTICS + exposure_statistic_names(exposure_windows) if exposure_windows else STATISTICS
+
+    start = time.perf_counter()
+    latencies = observed_latencies(data) if exposure_windows else None
+    observed = observed_statistics(data, statistics, latencies)
+    timings['observed'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    metadata = None
+    if replicates_dir is not None:
+        # The fingerprint is only computed (by hashing the files) for
+        # replicates which are kept, so that they can be traced back.
+        metadata = {'seed': seed, 'engine': engine, 'fingerprint': data_fingerprint(data)}
+    replicate_arrays = allocate_replicates(statistics, replicates, replicates_dir,
+                                           replicate_dtypes(data, statistics), metadata)
+    simulated = run_replicates(data, replicates, seed, statistics, workers=workers, hosts=hosts,
+                               replicates=replicate_arrays, chunk_size=chunk_size, timeout=timeout)
+    timings['replicates'] = time.perf_counter() - start
+
+    results = summarize(observed, simulated)
+
+    report = {
+        'parameters': {
+            'cheaters': cheaters_path,
+            'teams': teams_path,
+            'kills': kills_path,
+            'replicates': replicates,
+            'seed': seed,
+            'workers': workers,
+            'engine': engine,
+            'hosts': [host + ':' + str(port) for host, port in hosts or []],
+            'exposure_windows': exposure_windows,
+            'replicates_dir': replicates_dir,
+            'chunk_size': chunk_size,
+            'timeout': timeout,
+        },
+        'results': results,
+        'timings': timings,
+    }
+
+    if latencies is not None:
+        report['latencies'] = {exposure: [float(latency) for latency in lst]
+                               for exposure, lst in latencies.items()}
+
+    return report
+
+
+def write_results(report, path, output_format):
+    '''Writes the report returned by run_analyses to a file.
+
+    Takes as argument the report, the path of the file, and the format:
+    'json' (the full report) or 'csv' (one row per statistic).
+    '''
+
+    with open(path, 'w', newline='') as file:
+        if output_format == 'json':
+            json.dump(report, file, indent=2)
+        else:
+            writer = csv.DictWriter(file, fieldnames=RESULT_FIELDS)
+            writer.writeheader()
+            writer.writerows(report['results'])
+
+
+def main(arguments=None):
+    '''Parses the command-line arguments, runs the analyses and writes
+    the results.
+    '''
+
+    parser = argparse.ArgumentParser(description='Run the three cheating analyses without the notebook.')
+    parser.add_argument('--cheaters', default=CHEATERS_PATH, help='path of cheaters.txt')
+    parser.add_argument('--teams', default=TEAMS_PATH, help='path of team_ids.txt')
+    parser.add_argument('--kills', default=KILLS_PATH, help='path of kills.txt')
+    parser.add_argument('--replicates', '-n', type=int, default=20, help='number of randomized replicates')
+    parser.add_argument('--seed', type=int, default=0, help='random seed')
+    parser.add_argument('--workers', type=int, default=1, help='number of worker processes')
+    parser.add_argument('--engine', choices=ENGINES, default='python', help='implementation of the analyses')
+    parser.add_argument('--hosts', nargs='+', type=parse_address, default=None, metavar='HOST:PORT',
+                        help='remote workers (started with distributed_replicates.py) running the replicates')
+    parser.add_argument('--chunk-size', type=int, default=None,
+                        help='number of replicates per task sent to a remote worker (by default, at most '
+                             + str(MAX_CHUNK_SIZE) + ')')
+    parser.add_argument('--timeout', type=float, default=None,
+                        help='seconds to wait for a remote worker to connect or answer (by default, '
+                             + str(TIMEOUT) + '; running workers send heartbeats)')
+    parser.add_argument('--exposure-windows', nargs='+', type=int, default=None, metavar='DAYS',
+                        help='also count players who started cheating within these days of an exposure')
+    parser.add_argument('--replicates-dir', default=None,
+                        help='folder where the value of every replicate is written (memory-mappable .npy files)')
+    parser.add_argument('--output', default='results.json', help='file where the results are written')
+    parser.add_argument('--format', choices=['json', 'csv'], default=None,
+                        help='output format (by default, taken from the extension of the output file)')
+    parser.add_argument('--stages', action='store_true',
+                        help='record the timing of every stage and include it in the JSON output')
+    args = parser.parse_args(arguments)
+
+    output_format = args.format or ('csv' if args.output.endswith('.csv') else 'json')
+
+    if args.stages:
+        instrumentation.enable()
+
+    report = run_analyses(args.cheaters, args.teams, args.kills, args.replicates, args.seed, args.workers,
+                          args.engine, args.hosts, args.exposure_windows, args.replicates_dir, args.chunk_size,
+                          args.timeout)
+
+    if args.stages:
+        instrumentation.disable()
+        report['stages'] = instrumentation.get_records()
+
+    write_results(report, args.output, output_format)
+
+
+if __name__ == '__main__':
+    main()
@@ -11,9 +11,19 @@ number of teams with several cheaters, the number of 'victim cheaters',
 and the number of 'observer cheaters' varies.
 '''
 
+import os
 import random
+import time
 from collections import defaultdict
+from multiprocessing import Pool
 from numpy import std
+from numpy.random import default_rng
+
+from instrumentation import instrumented, stage, add_record, is_enabled
+import vectorized_engine
+from replicate_storage import allocate_replicates, flush_replicates, narrowest_dtype
+from exposure_index import build_exposure_index, exposure_latencies, exposure_values, latency_statistics, \
+    exposure_dtypes, is_exposure_statistic
 
 from reading_files import *
 from statistical_methods import *
@@ -23,13 +33,16 @@ from team_randomization import *
 from kills_randomization import *
 
 
-def cheaters_teaming_up_simulation(n):
+@instrumented('cheaters_teaming_up_simulation', rows=None)
+def cheaters_teaming_up_simulation(n, data_dir=DATA_DIR, replicates_dir=None):
     ''' Calculates the expected value and confidence intervals for the
     number of teams with 0, 1, 2, 3, and 4 cheaters, based on data from
     n simulations.
     
     Takes as argument an integer n, which defines the number of simulations
-    to perform.
+    to perform, optionally the folder with the data files, and optionally
+    a folder where the value of every simulation is kept (see
+    replicate_storage).
     
     Returns 5 strings and 5 integer values, which correspond to the
     confidence intervals and expected values of the number of teams
@@ -38,57 +51,70 @@ def cheaters_teaming_up_simulation(n):
     
     # Firstly, so that the simulations work on their own, I obtain
     # the data directly from the text files.
-    cheaters = get_cheaters()
-    teams = get_teams()
+    cheaters = get_cheaters(os.path.join(data_dir, 'cheaters.txt'))
+    teams = get_teams(os.path.join(data_dir, 'team_ids.txt'))
 
-    # Then, I create lists which will hold the estimates of each simulation.
-    zero_cheaters_list = []
-    one_cheater_list = []
-    two_cheaters_list = []
-    three_cheaters_list = []
-    four_cheaters_list = []
+    # Then, I preallocate typed arrays which will hold the estimates of each
+    # simulation, instead of growing lists of Python integers. No counter
+    # can exceed the number of teams, which sets the width of the arrays.
+    team_dtype = narrowest_dtype(count_teams(teams))
+    replicates = allocate_replicates(TEAM_STATISTICS, n, replicates_dir,
+                                     dict.fromkeys(TEAM_STATISTICS, team_dtype))
+    zero_cheaters_array = replicates['zero_cheaters']
+    one_cheater_array = replicates['one_cheater']
+    two_cheaters_array = replicates['two_cheaters']
+    three_cheaters_array = replicates['three_cheaters']
+    four_cheaters_array = replicates['four_cheaters']
 
     # Then, I go through with the simulation.
     for i in range(n):
         
-        # I start by updating the teams list with the new randomized data.
-        teams = get_shuffled_teams(teams)
+        # Each replicate is measured on its own when instrumentation is on.
+        with stage('cheaters_teaming_up_replicate', rows=len(teams), replicate=i):
+
+            # I start by updating the teams list with the new randomized data.
+            teams = get_shuffled_teams(teams)
 
-        # Then, I obtain the counts of teams with 0, 1, 2, 3, or 4 cheaters
-        # assuming the new shuffled data.
-        zero_cheaters, one_cheater, two_cheaters, three_cheaters, four_cheaters =         get_cheater_counters(cheaters, teams)
+            # Then, I obtain the counts of teams with 0, 1, 2, 3, or 4 cheaters
+            # assuming the new shuffled data.
+            zero_cheaters, one_cheater, two_cheaters, three_cheaters, four_cheaters =             get_cheater_counters(cheaters, teams)
                 
-        # Finally, I store the relevant information in the previously created lists.
-        zero_cheaters_list.append(zero_cheaters)
-        one_cheater_list.append(one_cheater)
-        two_cheaters_list.append(two_cheaters)
-        three_cheaters_list.append(three_cheaters)
-        four_cheaters_list.append(four_cheaters)
+        # Finally, I store the relevant information in the previously created arrays.
+        zero_cheaters_array[i] = zero_cheaters
+        one_cheater_array[i] = one_cheater
+        two_cheaters_array[i] = two_cheaters
+        three_cheaters_array[i] = three_cheaters
+        four_cheaters_array[i] = four_cheaters
+
+    flush_replicates(replicates)
 
     # Once that is done, I can present the confidence intervals and means for 
     # each of the counters.
-    ci_zero_cheaters = confidence_interval(zero_cheaters_list)
-    ci_one_cheater = confidence_interval(one_cheater_list)
-    ci_two_cheaters = confidence_interval(two_cheaters_list)
-    ci_three_cheaters = confidence_interval(three_cheaters_list)
-    ci_four_cheaters = confidence_interval(four_cheaters_list)
-    
-    mean_zero_cheaters = mean(zero_cheaters_list)
-    mean_one_cheater = mean(one_cheater_list)
-    mean_two_cheaters = mean(two_cheaters_list)
-    mean_three_cheaters = mean(three_cheaters_list)
-    mean_four_cheaters = mean(four_cheaters_list)
+    ci_zero_cheaters = confidence_interval(zero_cheaters_array)
+    ci_one_cheater = confidence_interval(one_cheater_array)
+    ci_two_cheaters = confidence_interval(two_cheaters_array)
+    ci_three_cheaters = confidence_interval(three_cheaters_array)
+    ci_four_cheaters = confidence_interval(four_cheaters_array)
+    
+    mean_zero_cheaters = mean(zero_cheaters_array)
+    mean_one_cheater = mean(one_cheater_array)
+    mean_two_cheaters = mean(two_cheaters_array)
+    mean_three_cheaters = mean(three_cheaters_array)
+    mean_four_cheaters = mean(four_cheaters_array)
     
     return ci_zero_cheaters, mean_zero_cheaters, ci_one_cheater, mean_one_cheater,             ci_two_cheaters, mean_two_cheaters, ci_three_cheaters, mean_three_cheaters,               ci_four_cheaters, mean_four_cheaters
 
 
-def victim_cheaters_simulation(n):
+@instrumented('victim_cheaters_simulation', rows=None)
+def victim_cheaters_simulation(n, data_dir=DATA_DIR, replicates_dir=None):
     ''' Calculates the expected value and confidence intervals for the
     number of players that started cheating only after having been killed
     by an a player that was already cheating.
     
     Takes as argument an integer n, which defines the number of simulations
-    to perform.
+    to perform, optionally the folder with the data files, and optionally
+    a folder where the value of every simulation is kept (see
+    replicate_storage).
     
     Returns 1 strings and 1 integer value, which correspond to the confidence
     interval and expected value of the number of these 'victim cheaters'.
@@ -96,40 +122,50 @@ def victim_cheaters_simulation(n):
     
     # Firstly, so that the simulations work on their own, I obtain
     # the data directly from the text files.
-    cheaters = get_cheaters()
-    teams = get_teams()
-    kills = get_kills()
+    cheaters = get_cheaters(os.path.join(data_dir, 'cheaters.txt'))
+    teams = get_teams(os.path.join(data_dir, 'team_ids.txt'))
+    kills = get_kills(os.path.join(data_dir, 'kills.txt'))
 
-    # Then, I create a list which will hold the estimates of each simulation.
-    vic_cheaters_ev_list = []
+    # Then, I preallocate a typed array which will hold the estimates of each simulation
+    # (which can be at most the number of cheaters).
+    cheater_dtype = narrowest_dtype(len(cheaters))
+    vic_cheaters_ev_array = allocate_replicates(['victim_cheaters'], n, replicates_dir,
+                                                {'victim_cheaters': cheater_dtype})['victim_cheaters']
 
     # Then, I go through with the simulation.
     for i in range(n):
         
-        # I start by updating the kills list with the new randomized data.
-        kills = get_shuffled_kills(kills)
+        with stage('victim_cheaters_replicate', rows=len(kills), replicate=i):
+
+            # I start by updating the kills list with the new randomized data.
+            kills = get_shuffled_kills(kills)
 
-        # Then, I obtain the estimated number of 'victim cheaters'.
-        matches_start = match_starting_time(kills)
-        vic_cheaters_ev = counter_victim_cheaters(kills, matches_start, cheaters)
+            # Then, I obtain the estimated number of 'victim cheaters'.
+            matches_start = match_starting_time(kills)
+            vic_cheaters_ev = counter_victim_cheaters(kills, matches_start, cheaters)
         
-        # Finally, I store the relevant information in the previously created list.
-        vic_cheaters_ev_list.append(vic_cheaters_ev)
+        # Finally, I store the relevant information in the previously created array.
+        vic_cheaters_ev_array[i] = vic_cheaters_ev
+
+    flush_replicates({'victim_cheaters': vic_cheaters_ev_array})
 
     # Now, I can compute the confidence intervals and mean from the estimates.
-    ci_victim_cheaters = confidence_interval(vic_cheaters_ev_list)
-    mean_victim_cheaters = mean(vic_cheaters_ev_list)
+    ci_victim_cheaters = confidence_interval(vic_cheaters_ev_array)
+    mean_victim_cheaters = mean(vic_cheaters_ev_array)
     
     return ci_victim_cheaters, mean_victim_cheaters
 
 
-def observer_cheaters_simulation(n):
+@instrumented('observer_cheaters_simulation', rows=None)
+def observer_cheaters_simulation(n, data_dir=DATA_DIR, replicates_dir=None):
     ''' Calculates the expected value and confidence intervals for the
     number of players that started cheating only after having observed
     an actively cheating player obtain at least 3 kills.
     
     Takes as argument an integer n, which defines the number of simulations
-    to perform.
+    to perform, optionally the folder with the data files, and optionally
+    a folder where the value of every simulation is kept (see
+    replicate_storage).
     
     Returns 1 string and 1 integer value, which correspond to the confidence
     interval and expected value of the number of these 'observer cheaters'.
@@ -137,28 +173,378 @@ def observer_cheaters_simulation(n):
     
     # Firstly, so that the simulations work on their own, I obtain
     # the data directly from the text files.
-    cheaters = get_cheaters()
-    teams = get_teams()
-    kills = get_kills()
+    cheaters = get_cheaters(os.path.join(data_dir, 'cheaters.txt'))
+    teams = get_teams(os.path.join(data_dir, 'team_ids.txt'))
+    kills = get_kills(os.path.join(data_dir, 'kills.txt'))
 
-    # Then, I create a list which will hold the estimates of each simulation.
-    obs_cheaters_ev_list = []
+    # Then, I preallocate a typed array which will hold the estimates of each simulation
+    # (which can be at most the number of cheaters).
+    cheater_dtype = narrowest_dtype(len(cheaters))
+    obs_cheaters_ev_array = allocate_replicates(['observer_cheaters'], n, replicates_dir,
+                                                {'observer_cheaters': cheater_dtype})['observer_cheaters']
 
     # Then, I go through with the simulation.
     for i in range(n):
         
-        # I start by updating the kills list with the new randomized data.
-        kills = get_shuffled_kills(kills)
+        with stage('observer_cheaters_replicate', rows=len(kills), replicate=i):
 
-        # Then, I obtain the estimated number of 'observer cheaters'.
-        obs_cheaters_ev = get_observer_cheaters(cheaters, kills)
+            # I start by updating the kills list with the new randomized data.
+            kills = get_shuffled_kills(kills)
+
+            # Then, I obtain the estimated number of 'observer cheaters'.
+            obs_cheaters_ev = get_observer_cheaters(cheaters, kills)
         
-        # Finally, I store the relevant information in the previously created list.
-        obs_cheaters_ev_list.append(obs_cheaters_ev)
+        # Finally, I store the relevant information in the previously created array.
+        obs_cheaters_ev_array[i] = obs_cheaters_ev
+
+    flush_replicates({'observer_cheaters': obs_cheaters_ev_array})
 
     # Now, I can compute the confidence intervals and mean from the estimates.
-    ci_observer_cheaters = confidence_interval(obs_cheaters_ev_list)
-    mean_observer_cheaters = mean(obs_cheaters_ev_list)
+    ci_observer_cheaters = confidence_interval(obs_cheaters_ev_array)
+    mean_observer_cheaters = mean(obs_cheaters_ev_array)
     
     return ci_observer_cheaters, mean_observer_cheaters
 
+
+# Names of the statistics computed in each replicate, in the order in which
+# they are reported.
+TEAM_STATISTICS = ['zero_cheaters', 'one_cheater', 'two_cheaters', 'three_cheaters', 'four_cheaters']
+INTERACTION_STATISTICS = ['victim_cheaters', 'observer_cheaters']
+STATISTICS = TEAM_STATISTICS + INTERACTION_STATISTICS
+
+ENGINES = ['python', 'vectorized']
+
+
+@instrumented('load_data', rows=None)
+def load_data(cheaters_path=CHEATERS_PATH, teams_path=TEAMS_PATH, kills_path=KILLS_PATH, engine='python'):
+    ''' Loads the three data files once, so that every analysis (and every
+    replicate) can be run over the same data.
+    
+    Takes as argument the paths of the three files, and the engine used
+    for the analyses ('python' for the functions in this repository, or
+    'vectorized' for those in vectorized_engine).
+    
+    Returns a dictionary with the cheaters dictionary, the teams and kills
+    lists, the engine, the paths of the files (whose fingerprint is only
+    computed when needed, see data_fingerprint), and (for the vectorized
+    engine) the encoded arrays.
+    '''
+    
+    if engine not in ENGINES:
+        raise ValueError('engine must be one of ' + ', '.join(ENGINES))
+    
+    data = {
+        'cheaters': get_cheaters(cheaters_path),
+        'teams': get_teams(teams_path),
+        'kills': get_kills(kills_path),
+        'engine': engine,
+        'paths': [cheaters_path, teams_path, kills_path],
+    }
+    
+    if engine == 'vectorized':
+        data['encoded'] = vectorized_engine.encode_dataset(data['cheaters'], data['teams'], data['kills'])
+    
+    return data
+
+
+def data_fingerprint(data):
+    ''' Returns the fingerprint of the files of the data returned by
+    load_data (see dataset_fingerprint).
+    
+    Hashing the files means reading them once more, so it is only done
+    the first time the fingerprint is needed (e.g. by remote workers),
+    and then kept in the data.
+    '''
+    
+    if 'fingerprint' not in data:
+        data['fingerprint'] = dataset_fingerprint(data['paths'])
+    return data['fingerprint']
+
+
+def _statistics_values(team_counters, interaction_counters, statistics, exposures=None):
+    ''' Pairs the names of the requested statistics with their values.
+    
+    Takes as argument the five team counters and the two interaction
+    counters (either can be None if not computed), the list of names, and
+    optionally the dictionary of exposure statistics (see exposure_index).
+    '''
+    
+    values = dict(exposures or {})
+    if team_counters is not None:
+        values.update(zip(TEAM_STATISTICS, team_counters))
+    if interaction_counters is not None:
+        values.update(zip(INTERACTION_STATISTICS, interaction_counters))
+    
+    return {name: values[name] for name in statistics}
+
+
+def _needed_data(statistics):
+    ''' Returns whether a list of statistic names needs the teams, the
+    interaction counters, and the exposure statistics.
+    '''
+    
+    return (any(name in TEAM_STATISTICS for name in statistics),
+            any(name in INTERACTION_STATISTICS for name in statistics),
+            any(is_exposure_statistic(name) for name in statistics))
+
+
+def replicate_dtypes(data, statistics=STATISTICS):
+    ''' Pairs each statistic name with the numpy dtype of its replicates,
+    for allocate_replicates.
+    
+    Every count is bounded by the data, whatever the randomization: the
+    team counters by the number of teams, and the other counts by the
+    number of cheaters (each cheater is counted at most once). So each one
+    gets the narrowest unsigned integer dtype holding its bound, and the
+    mean latencies get those of exposure_dtypes.
+    '''
+    
+    needs_teams, _, _ = _needed_data(statistics)
+    dtypes = {}
+    
+    if needs_teams:
+        if data['engine'] == 'vectorized':
+            nr_teams = data['encoded']['nr_teams']
+        else:
+            nr_teams = count_teams(data['teams'])
+        dtypes.update(dict.fromkeys(TEAM_STATISTICS, narrowest_dtype(nr_teams)))
+    
+    cheater_dtype = narrowest_dtype(len(data['cheaters']))
+    dtypes.update({name: cheater_dtype for name in statistics if name not in TEAM_STATISTICS})
+    dtypes.update(exposure_dtypes(statistics))
+    
+    return {name: dtypes[name] for name in statistics}
+
+
+def observed_latencies(data):
+    ''' Returns a dictionary pairing each kind of exposure to cheating
+    with the latencies in days between the last exposure of every cheater
+    and their start, on the observed data (see exposure_index).
+    
+    Takes as argument the dictionary returned by load_data.
+    '''
+    
+    if data['engine'] == 'vectorized':
+        return vectorized_engine.exposure_latencies(data['encoded'])
+    
+    return exposure_latencies(build_exposure_index(data['kills'], data['cheaters']), data['cheaters'])
+
+
+@instrumented('observed_statistics', rows=None)
+def observed_statistics(data, statistics=STATISTICS, latencies=None):
+    ''' Computes the statistics on the observed (not randomized) data.
+    
+    Takes as argument the dictionary returned by load_data, a list of
+    statistic names (which can include those of exposure_index), and
+    optionally the latencies returned by observed_latencies, if they have
+    already been computed. Returns a dictionary pairing each name with its
+    value.
+    '''
+    
+    needs_teams, needs_interactions, needs_exposures = _needed_data(statistics)
+    team_counters = None
+    interaction_counters = None
+    exposures = None
+    
+    if data['engine'] == 'vectorized':
+        if needs_teams:
+            team_counters = vectorized_engine.cheater_counters(data['encoded'])
+        if needs_interactions:
+            interaction_counters = vectorized_engine.interaction_counters(data['encoded'])
+    
+    else:
+        cheaters = data['cheaters']
+        kills = data['kills']
+        if needs_teams:
+            team_counters = get_cheater_counters(cheaters, data['teams'])
+        if needs_interactions:
+            matches_start = match_starting_time(kills)
+            interaction_counters = (counter_victim_cheaters(kills, matches_start, cheaters),
+                                    get_observer_cheaters(cheaters, kills))
+    
+    if needs_exposures:
+        if latencies is None:
+            latencies = observed_latencies(data)
+        exposures = latency_statistics(latencies, statistics)
+    
+    return _statistics_values(team_counters, interaction_counters, statistics, exposures)
+
+
+def replicate_seed(seed, replicate):
+    ''' Returns the seed of a single replicate. Each replicate has its own
+    seed, so that its result does not depend on how replicates are split
+    among workers.
+    '''
+    
+    return seed * 2 ** 32 + replicate
+
+
+def replicate_statistics(data, seed, statistics=STATISTICS):
+    ''' Computes the statistics on one randomized version of the data.
+    
+    Takes as argument the dictionary returned by load_data, the seed of
+    the replicate and a list of statistic names (which can include those
+    of exposure_index). Returns a dictionary pairing each name with its
+    value in this replicate.
+    '''
+    
+    needs_teams, needs_interactions, needs_exposures = _needed_data(statistics)
+    team_counters = None
+    interaction_counters = None
+    exposures = None
+    cheaters = data['cheaters']
+    
+    if data['engine'] == 'vectorized':
+        encoded = data['encoded']
+        rng = default_rng(seed)
+        if needs_teams:
+            team_counters = vectorized_engine.cheater_counters(encoded, vectorized_engine.shuffled_teams(encoded, rng))
+        if needs_interactions or needs_exposures:
+            killer, killed = vectorized_engine.shuffled_kills(encoded, rng)
+        if needs_interactions:
+            interaction_counters = vectorized_engine.interaction_counters(encoded, killer, killed)
+        if needs_exposures:
+            latencies = vectorized_engine.exposure_latencies(encoded, killer, killed)
+            exposures = latency_statistics(latencies, statistics)
+    
+    else:
+        # Each replicate has its own generator, rather than seeding the
+        # global one, so that replicates can run in several threads at once.
+        rng = random.Random(seed)
+        if needs_teams:
+            team_counters = get_cheater_counters(cheaters, get_shuffled_teams(data['teams'], rng))
+        if needs_interactions or needs_exposures:
+            # get_shuffled_kills updates the kills in place, so I shuffle a
+            # copy to keep the original data for the next replicates.
+            kills = get_shuffled_kills([kill[:] for kill in data['kills']], rng)
+        if needs_interactions:
+            matches_start = match_starting_time(kills)
+            # As in the notebook, both counts are computed on the same
+            # randomized kills.
+            interaction_counters = (counter_victim_cheaters(kills, matches_start, cheaters),
+                                    get_observer_cheaters(cheaters, kills))
+        if needs_exposures:
+            exposures = exposure_values(kills, cheaters, statistics)
+    
+    return _statistics_values(team_counters, interaction_counters, statistics, exposures)
+
+
+# Data shared with the worker processes, set once when each worker starts.
+_worker_data = None
+
+
+def _init_worker(data):
+    ''' Stores the data in a worker process, so that it is sent only once
+    instead of with every replicate.
+    '''
+    
+    global _worker_data
+    _worker_data = data
+
+
+def _timed_replicate(data, seed, statistics):
+    ''' Computes one replicate, and returns a tuple with its statistics
+    (as replicate_statistics does) and its wall and CPU times in seconds.
+    '''
+    
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    result = replicate_statistics(data, seed, statistics)
+    return result, time.perf_counter() - wall_start, time.process_time() - cpu_start
+
+
+def _worker_replicate(arguments):
+    ''' Computes one replicate in a worker process, from a tuple with its
+    seed and the list of statistic names, and returns it with its times
+    (as _timed_replicate does).
+    '''
+    
+    seed, statistics = arguments
+    return _timed_replicate(_worker_data, seed, statistics)
+
+
+# Names of the arrays with the times of each replicate (see run_replicates).
+TIMES = ['wall_time', 'cpu_time']
+
+
+def allocate_times(n):
+    ''' Preallocates the arrays where run_replicates stores the wall and
+    CPU times (in seconds) of n replicates.
+    '''
+    
+    return allocate_replicates(TIMES, n, dtypes=dict.fromkeys(TIMES, 'float64'))
+
+
+@instrumented('run_replicates', rows=None)
+def run_replicates(data, n, seed=0, statistics=STATISTICS, workers=1, first=0, hosts=None, replicates=None,
+                   chunk_size=None, timeout=None, times=None):
+    ''' Computes the statistics on n randomized versions of the data.
+    
+    Takes as argument the dictionary returned by load_data, the number
+    of replicates, a seed, a list of statistic names, the number of worker
+    processes, the index of the first replicate, optionally a list of
+    (host, port) addresses of workers started with distributed_replicates,
+    to which ranges of replicates are sent instead, and optionally the
+    arrays where the values are stored (as returned by allocate_replicates,
+    e.g. to keep them on disk; by default, in memory with the dtypes of
+    replicate_dtypes). With workers, the number of replicates per
+    task and the timeout (in seconds) can also be set (see run_distributed).
+    Optionally, the arrays returned by allocate_times are filled with the
+    times of each replicate.
+    
+    When the instrumentation is on, each replicate is recorded as a
+    'replicate' stage, also when it runs in a worker process or on a
+    remote worker (with its times measured there).
+    
+    Returns a dictionary pairing each statistic name with the array of its
+    values, in the order of the replicates. The result only depends on the
+    seed and replicate indexes, not on the number or location of workers.
+    The statistics of exposure_index are computed on the same randomized
+    kills as the interaction counters.
+    '''
+    
+    if replicates is None:
+        replicates = allocate_replicates(statistics, n, dtypes=replicate_dtypes(data, statistics))
+    
+    if hosts:
+        # Imported here, since distributed_replicates itself relies on
+        # this module.
+        from distributed_replicates import run_distributed
+        if times is None and is_enabled():
+            times = allocate_times(n)
+        run_distributed(hosts, data_fingerprint(data), data['engine'], n, seed, statistics, first,
+                        chunk_size, timeout, replicates=replicates, times=times)
+        if is_enabled():
+            for index in range(n):
+                add_record('replicate', float(times['wall_time'][index]), float(times['cpu_time'][index]),
+                           replicate=first + index)
+        return replicates
+    
+    seeds = (replicate_seed(seed, replicate) for replicate in range(first, first + n))
+    
+    if workers > 1:
+        with Pool(workers, initializer=_init_worker, initargs=(data,)) as pool:
+            # Results arrive in order, and are stored straight away, so
+            # that they never pile up as Python objects.
+            results = pool.imap(_worker_replicate, ((replicate, statistics) for replicate in seeds),
+                                chunksize=max(1, min(1000, n // (4 * workers))))
+            for index, (result, wall_time, cpu_time) in enumerate(results):
+                for name in statistics:
+                    replicates[name][index] = result[name]
+                if times is not None:
+                    times['wall_time'][index] = wall_time
+                    times['cpu_time'][index] = cpu_time
+                add_record('replicate', wall_time, cpu_time, replicate=first + index)
+    
+    else:
+        for index, replicate in enumerate(seeds):
+            with stage('replicate', replicate=first + index):
+                result, wall_time, cpu_time = _timed_replicate(data, replicate, statistics)
+            for name in statistics:
+                replicates[name][index] = result[name]
+            if times is not None:
+                times['wall_time'][index] = wall_time
+                times['cpu_time'][index] = cpu_time
+    
+    flush_replicates(replicates)
+    return replicates
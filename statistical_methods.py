@@ -10,27 +10,30 @@ concepts necessary for our analysis, namely means and confidence
 intervals.
 '''
 
-from numpy import std
+from numpy import std, asarray, count_nonzero, float64
+from numpy import mean as array_mean
 
 
 def mean(lst):
-    ''' Calculates the mean of a list of values.
+    ''' Calculates the mean of a list (or array) of values.
     
     Takes as argument a list of integers. Returns the mean
     as a float value.
     '''
     
-    mean = sum(lst) / len(lst)
+    # I accumulate in 64-bit floats, since summing a large array of 32-bit
+    # integers could overflow.
+    mean = float(array_mean(lst, dtype=float64))
     return mean
 
 
-def confidence_interval(lst):
+def confidence_bounds(lst):
     ''' Calculates the approximation of the confidence interval of a
     value.
     
     Takes as argument a list composed of integers, which are estimations
-    of a specific value. Returns a string value which indicates the lower
-    and upper bounds of the confidence interval.
+    of a specific value. Returns two floats, the lower and upper bounds
+    of the confidence interval.
     ''' 
     
     avg = mean(lst)
@@ -40,5 +43,43 @@ def confidence_interval(lst):
     lower_bound = avg - 1.96 * (std_dev / n ** 0.5)
     upper_bound = avg + 1.96 * (std_dev / n ** 0.5)
     
+    return float(lower_bound), float(upper_bound)
+
+
+def confidence_interval(lst):
+    ''' Calculates the approximation of the confidence interval of a
+    value.
+    
+    Takes as argument a list composed of integers, which are estimations
+    of a specific value. Returns a string value which indicates the lower
+    and upper bounds of the confidence interval.
+    ''' 
+    
+    lower_bound, upper_bound = confidence_bounds(lst)
+    
     return '[' + "{:.1f}".format(lower_bound) + ' : ' + "{:.1f}".format(upper_bound) + ']'
 
+
+def p_value(observed, lst, alternative='greater'):
+    ''' Calculates the p-value of an observed value, given the values
+    obtained in randomized simulations.
+    
+    Takes as argument the observed value, a list (or array) of simulated
+    values, and the alternative hypothesis: 'greater' (the observed value
+    is larger than expected), 'less', or 'two-sided'.
+    Returns the share of simulations (counting the observed data as one
+    of them) with a value at least as large as the observed one, at most
+    as large, or (for 'two-sided') twice the smaller of both, up to 1.
+    '''
+    
+    values = asarray(lst)
+    greater = (int(count_nonzero(values >= observed)) + 1) / (len(lst) + 1)
+    less = (int(count_nonzero(values <= observed)) + 1) / (len(lst) + 1)
+    
+    if alternative == 'greater':
+        return greater
+    if alternative == 'less':
+        return less
+    if alternative == 'two-sided':
+        return min(1.0, 2 * min(greater, less))
+    raise ValueError("alternative must be 'greater', 'less' or 'two-sided'")
@@ -12,7 +12,10 @@ allocation among players in a match.
 from collections import defaultdict
 import random
 
+from instrumentation import instrumented
 
+
+@instrumented('matches_composition')
 def matches_composition(teams):
     ''' Creates a dictionary with the composition of matches in terms
     of players and respective team number.
@@ -34,13 +37,15 @@ def matches_composition(teams):
     return match_team_composition
 
 
-def team_shuffle(match_team_composition):
+@instrumented('team_shuffle')
+def team_shuffle(match_team_composition, rng=random):
     ''' Randomly shuffles the team allocation among player account ids
     for every match.
     
     Takes as argument a dictionary, where keys are match ids, and where
     the values are lists of the same lenght, one for player ids, and
-    the other for corresponding team numbers.
+    the other for corresponding team numbers, and optionally a random
+    generator (by default, the global one of the random module).
     
     Returns an equivalent dictionary, for which the list of team numbers
     for each match has been shuffled. 
@@ -48,12 +53,13 @@ def team_shuffle(match_team_composition):
     
     for key, value in match_team_composition.items():
         temp_list = value[1][:]
-        random.shuffle(temp_list)
+        rng.shuffle(temp_list)
         match_team_composition[key] = [value[0], temp_list]
 
     return match_team_composition
 
 
+@instrumented('teams_updating', rows='output')
 def teams_updating(match_team_composition):
     ''' Creates a new list with details of team numbers for each player
     in each match.
@@ -72,18 +78,20 @@ def teams_updating(match_team_composition):
             
     return teams
 
-def get_shuffled_teams(teams):
+@instrumented('get_shuffled_teams')
+def get_shuffled_teams(teams, rng=random):
     ''' Executes the defined functions necessary to obtain a list of teams
     after randomization.
     
     Takes as argument an original list of teams, where elements are lists
-    with match id, player account id, and team number.
+    with match id, player account id, and team number, and optionally a
+    random generator (e.g. a random.Random with its own seed).
     
     Returns an equivalent list of teams, with randomized team allocations.
     '''
     
     match_team_composition = matches_composition(teams)
-    match_team_composition = team_shuffle(match_team_composition)
+    match_team_composition = team_shuffle(match_team_composition, rng)
     teams = teams_updating(match_team_composition)
     
     return teams
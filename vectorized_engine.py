@@ -0,0 +1,374 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+'''
+This module provides vectorized (numpy) versions of the three analyses
+and of the randomizations they rely on. The data is first encoded into
+integer arrays, so that each count or shuffle becomes a handful of array
+operations instead of a loop over every kill or team member.
+
+The counts are the same as those obtained with the functions in
+cheaters_teaming_up and cheaters_interactions, which can be checked on a
+generated dataset with:
+
+    python vectorized_engine.py --check
+'''
+
+import argparse
+import os
+import tempfile
+
+import numpy as np
+
+from instrumentation import instrumented
+
+
+_MICROSECONDS_PER_DAY = 86400 * 10 ** 6
+
+
+def _intern(values, codes):
+    '''Returns an array with the integer code of each value, adding new
+    values to the dictionary of codes as they appear.
+    '''
+
+    return np.fromiter((codes.setdefault(value, len(codes)) for value in values), dtype=np.int64,
+                       count=len(values))
+
+
+@instrumented('encode_dataset', rows=2)
+def encode_dataset(cheaters, teams, kills):
+    '''Encodes the data into numpy arrays.
+
+    Takes as argument the cheaters dictionary, the list of teams, and the
+    list of kills (as returned by the functions in reading_files).
+
+    Returns a dictionary of arrays: match, killer, killed and time of
+    each kill, player and team of each team member, the starting date of
+    cheating of each player (with a flag for cheaters), and the account id
+    of each player code.
+    '''
+
+    player_codes = {}
+    match_codes = {}
+    team_codes = {}
+
+    # Every player in the cheaters dictionary gets a code first, so that
+    # their starting dates can be stored in a single array.
+    _intern(list(cheaters), player_codes)
+
+    kill_match = _intern([kill[0] for kill in kills], match_codes)
+    killer = _intern([kill[1] for kill in kills], player_codes)
+    killed = _intern([kill[2] for kill in kills], player_codes)
+    time = np.array([kill[3] for kill in kills], dtype='datetime64[us]').astype(np.int64)
+
+    team_match = _intern([team[0] for team in teams], {})
+    team_player = _intern([team[1] for team in teams], player_codes)
+    team = _intern([team[0] + ' - ' + team[2] for team in teams], team_codes)
+
+    nr_players = len(player_codes)
+    is_cheater = np.zeros(nr_players, dtype=bool)
+    is_cheater[:len(cheaters)] = True
+    cheating_start = np.zeros(nr_players, dtype=np.int64)
+    cheating_start[:len(cheaters)] = np.array([dates[0] for dates in cheaters.values()],
+                                              dtype='datetime64[us]').astype(np.int64)
+
+    return {
+        'kill_match': kill_match,
+        'killer': killer,
+        'killed': killed,
+        'time': time,
+        'nr_matches': len(match_codes),
+        'team_player': team_player,
+        'team': team,
+        'nr_teams': len(team_codes),
+        # Rows of the teams list grouped by match, used by the team shuffle.
+        'team_rows_by_match': np.argsort(team_match, kind='stable'),
+        'team_match_sorted': np.sort(team_match, kind='stable'),
+        'nr_players': nr_players,
+        'is_cheater': is_cheater,
+        'cheating_start': cheating_start,
+        'player_ids': np.array(list(player_codes), dtype=object),
+    }
+
+
+@instrumented('vectorized_cheater_counters', rows=None)
+def cheater_counters(data, team=None):
+    '''Returns five integers, the number of teams with 0, 1, 2, 3, or 4
+    cheaters, as get_cheater_counters does.
+
+    Takes as argument the encoded data and, optionally, the (shuffled)
+    team of each team member.
+    '''
+
+    if team is None:
+        team = data['team']
+
+    teams_cheaters = np.bincount(team, weights=data['is_cheater'][data['team_player']],
+                                 minlength=data['nr_teams']).astype(np.int64)
+    histogram = np.bincount(teams_cheaters, minlength=5)
+
+    one_cheater, two_cheaters, three_cheaters, four_cheaters = [int(count) for count in histogram[1:5]]
+    zero_cheaters = data['nr_teams'] - (one_cheater + two_cheaters + three_cheaters + four_cheaters)
+
+    return zero_cheaters, one_cheater, two_cheaters, three_cheaters, four_cheaters
+
+
+def _matches_start(data):
+    '''Returns the time of the earliest kill of every match.'''
+
+    matches_start = np.full(data['nr_matches'], np.iinfo(np.int64).max)
+    np.minimum.at(matches_start, data['kill_match'], data['time'])
+    return matches_start
+
+
+def _earliest_3rd_kill(data, killer, match_start):
+    '''Returns the time of the earliest 3rd kill of an actively cheating
+    player in every match (the largest int64 for matches without one), as
+    match_earliest_3rd_kill does.
+
+    Takes as argument the encoded data, the killer of each kill, and the
+    starting time of the match of each kill.
+    '''
+
+    kill_match = data['kill_match']
+    time = data['time']
+
+    # As in match_kills_per_cheater, I keep the kills of each cheater in
+    # each match in their original order, and take the third one.
+    cheater_kills = np.flatnonzero(data['is_cheater'][killer] & (data['cheating_start'][killer] > match_start))
+    group = kill_match[cheater_kills] * data['nr_players'] + killer[cheater_kills]
+    order = np.argsort(group, kind='stable')
+    group = group[order]
+    first_of_group = np.searchsorted(group, group, side='left')
+    third_kills = cheater_kills[order[np.arange(len(group)) - first_of_group == 2]]
+
+    earliest_3rd_kill = np.full(data['nr_matches'], np.iinfo(np.int64).max)
+    np.minimum.at(earliest_3rd_kill, kill_match[third_kills], time[third_kills])
+    return earliest_3rd_kill
+
+
+@instrumented('vectorized_interaction_counters', rows=None)
+def interaction_counters(data, killer=None, killed=None):
+    '''Returns two integers, the number of 'victim cheaters' and the
+    number of 'observer cheaters', as counter_victim_cheaters and
+    get_observer_cheaters do.
+
+    Takes as argument the encoded data and, optionally, the (shuffled)
+    killer and killed player of each kill.
+    '''
+
+    if killer is None:
+        killer = data['killer']
+        killed = data['killed']
+
+    kill_match = data['kill_match']
+    time = data['time']
+    is_cheater = data['is_cheater']
+    cheating_start = data['cheating_start']
+    nr_matches = data['nr_matches']
+
+    match_start = _matches_start(data)[kill_match]
+    killed_start = cheating_start[killed]
+    killer_start = cheating_start[killer]
+
+    # Victims: killed before starting to cheat, by a player already cheating.
+    pre_cheating = is_cheater[killed] & (match_start < killed_start)
+    victims = pre_cheating & is_cheater[killer] & (match_start > killer_start)
+    nr_victim_cheaters = len(np.unique(killed[victims]))
+
+    earliest_3rd_kill = _earliest_3rd_kill(data, killer, match_start)
+
+    # As in pre_cheating_matches, the last kill of a player in a match
+    # overwrites the previous ones, so I keep the last occurrence of each
+    # (player, match) pair.
+    pre_cheating_kills = np.flatnonzero(pre_cheating)[::-1]
+    pair = killed[pre_cheating_kills] * nr_matches + kill_match[pre_cheating_kills]
+    last_kills = pre_cheating_kills[np.unique(pair, return_index=True)[1]]
+
+    observers = time[last_kills] > earliest_3rd_kill[kill_match[last_kills]]
+    nr_observer_cheaters = len(np.unique(killed[last_kills][observers]))
+
+    return nr_victim_cheaters, nr_observer_cheaters
+
+
+@instrumented('vectorized_shuffled_kills', rows=None)
+def shuffled_kills(data, rng):
+    '''Randomly reassigns the players of every match among themselves, as
+    get_shuffled_kills does.
+
+    Takes as argument the encoded data and a numpy random generator.
+    Returns two arrays, the new killer and killed player of each kill.
+    '''
+
+    nr_players = data['nr_players']
+    kill_match = data['kill_match']
+
+    killer_pair = kill_match * nr_players + data['killer']
+    killed_pair = kill_match * nr_players + data['killed']
+    pairs = np.unique(np.concatenate([killer_pair, killed_pair]))
+
+    # Sorting by match, and then by a random key, gives a random
+    # permutation of the players within each match.
+    permutation = np.lexsort((rng.random(len(pairs)), pairs // nr_players))
+    new_players = pairs[permutation] % nr_players
+
+    killer = new_players[np.searchsorted(pairs, killer_pair)]
+    killed = new_players[np.searchsorted(pairs, killed_pair)]
+    return killer, killed
+
+
+def _latencies_since_last(codes, times, cheating_start, nr_cheaters):
+    '''Returns the latencies in days between the last exposure of every
+    cheater exposed before they started cheating, and that start.
+
+    Takes as argument the cheater code and time of each exposure, the
+    starting date of cheating of each player, and the number of cheaters.
+    '''
+
+    before = times < cheating_start[codes]
+    last_exposure = np.full(nr_cheaters, np.iinfo(np.int64).min)
+    np.maximum.at(last_exposure, codes[before], times[before])
+
+    exposed = last_exposure > np.iinfo(np.int64).min
+    return (cheating_start[:nr_cheaters][exposed] - last_exposure[exposed]) / _MICROSECONDS_PER_DAY
+
+
+@instrumented('vectorized_exposure_latencies', rows=None)
+def exposure_latencies(data, killer=None, killed=None):
+    '''Returns a dictionary pairing each kind of exposure to cheating
+    ('killed_by_cheater' and 'observed_cheater') with the array of
+    latencies in days since the last exposure, as exposure_latencies in
+    exposure_index does, without building a list of kills.
+
+    Takes as argument the encoded data and, optionally, the (shuffled)
+    killer and killed player of each kill.
+    '''
+
+    if killer is None:
+        killer = data['killer']
+        killed = data['killed']
+
+    kill_match = data['kill_match']
+    is_cheater = data['is_cheater']
+    cheating_start = data['cheating_start']
+    nr_cheaters = int(np.count_nonzero(is_cheater))
+
+    match_start = _matches_start(data)[kill_match]
+
+    # Killed by a player already cheating when the match started.
+    victims = is_cheater[killed] & is_cheater[killer] & (match_start > cheating_start[killer])
+
+    # As in build_exposure_index, I keep the last death of each cheater in
+    # each match, and compare it with the earliest 3rd kill of a cheater.
+    deaths = np.flatnonzero(is_cheater[killed])[::-1]
+    pair = killed[deaths] * data['nr_matches'] + kill_match[deaths]
+    last_deaths = deaths[np.unique(pair, return_index=True)[1]]
+    earliest_3rd_kill = _earliest_3rd_kill(data, killer, match_start)
+    observers = last_deaths[data['time'][last_deaths] > earliest_3rd_kill[kill_match[last_deaths]]]
+
+    return {
+        'killed_by_cheater': _latencies_since_last(killed[victims], match_start[victims], cheating_start,
+                                                   nr_cheaters),
+        'observed_cheater': _latencies_since_last(killed[observers], match_start[observers], cheating_start,
+                                                  nr_cheaters),
+    }
+
+
+@instrumented('vectorized_shuffled_teams', rows=None)
+def shuffled_teams(data, rng):
+    '''Randomly reassigns the team numbers among the players of every
+    match, as get_shuffled_teams does.
+
+    Takes as argument the encoded data and a numpy random generator.
+    Returns an array with the new team of each team member.
+    '''
+
+    rows = data['team_rows_by_match']
+    permutation = np.lexsort((rng.random(len(rows)), data['team_match_sorted']))
+
+    team = np.empty_like(data['team'])
+    team[rows] = data['team'][rows[permutation]]
+    return team
+
+
+def check_engine(data_dir, nr_shuffles=3, seed=0):
+    '''Checks that the counts of this module are the same as those of the
+    'python' engine, on the data files in a folder.
+
+    Both engines are compared, including the statistics of exposure_index,
+    on the observed data and, since they shuffle differently, on a few kills shuffled by this module (translated back
+    into a list of kills for the 'python' engine).
+
+    Takes as argument the folder, the number of shuffles and a seed.
+    Returns a list with a description of every count which differs (empty
+    if the check passes).
+    '''
+
+    # Imported here, since simulations_cheating itself relies on this
+    # module.
+    from simulations_cheating import STATISTICS, INTERACTION_STATISTICS, load_data, observed_statistics
+    from cheaters_interactions import match_starting_time, counter_victim_cheaters, get_observer_cheaters
+    from exposure_index import exposure_statistic_names, exposure_values, latency_statistics
+
+    exposure_statistics = exposure_statistic_names([1, 3, 7, None])
+
+    paths = [os.path.join(data_dir, name) for name in ['cheaters.txt', 'team_ids.txt', 'kills.txt']]
+    python_data = load_data(*paths, engine='python')
+    vectorized_data = load_data(*paths, engine='vectorized')
+
+    expected = observed_statistics(python_data, STATISTICS + exposure_statistics)
+    values = observed_statistics(vectorized_data, STATISTICS + exposure_statistics)
+    mismatches = [name + ' (observed)' for name in expected if values[name] != expected[name]]
+
+    encoded = vectorized_data['encoded']
+    cheaters = python_data['cheaters']
+    rng = np.random.default_rng(seed)
+
+    for shuffle in range(nr_shuffles):
+        killer, killed = shuffled_kills(encoded, rng)
+        values = interaction_counters(encoded, killer, killed) + \
+            tuple(latency_statistics(exposure_latencies(encoded, killer, killed), exposure_statistics).values())
+
+        player_ids = encoded['player_ids']
+        kills = [[kill[0], killer_id, killed_id, kill[3]]
+                 for kill, killer_id, killed_id in zip(python_data['kills'], player_ids[killer].tolist(),
+                                                       player_ids[killed].tolist())]
+        expected = (counter_victim_cheaters(kills, match_starting_time(kills), cheaters),
+                    get_observer_cheaters(cheaters, kills)) + \
+            tuple(exposure_values(kills, cheaters, exposure_statistics).values())
+
+        mismatches += [name + ' (shuffle ' + str(shuffle) + ')'
+                       for name, value, expected_value in zip(INTERACTION_STATISTICS + exposure_statistics, values,
+                                                              expected)
+                       if value != expected_value]
+
+    return mismatches
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Check that the vectorized engine gives the same counts.')
+    parser.add_argument('--check', action='store_true', required=True,
+                        help='compare both engines on a dataset')
+    parser.add_argument('--data-dir', default=None,
+                        help='folder with the data files (by default, a dataset is generated)')
+    parser.add_argument('--kills', type=int, default=20000, help='number of kills of the generated dataset')
+    parser.add_argument('--seed', type=int, default=0, help='random seed')
+    args = parser.parse_args()
+
+    # Imported here, since it is only needed to generate the data.
+    from data_generator import generate_dataset
+
+    with tempfile.TemporaryDirectory() as temporary_dir:
+        data_dir = args.data_dir
+        if data_dir is None:
+            data_dir = temporary_dir
+            generate_dataset(data_dir, args.kills, cheater_rate=0.1, seed=args.seed)
+        mismatches = check_engine(data_dir, seed=args.seed)
+
+    if mismatches:
+        raise SystemExit('the engines differ: ' + ', '.join(mismatches))
+    print('both engines give the same counts')